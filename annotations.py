@@ -0,0 +1,79 @@
+import math
+
+from utils import Drawer, GridIndex
+
+# Advance of a monospace character, and the ascent and descent of the font, relative to the font size
+CHAR_WIDTH = 0.6
+ASCENT = 0.8
+DESCENT = 0.2
+# Overlaps up to this are touching, not colliding, in mm
+TOUCH = 1e-6
+
+
+# Estimated extent of the text in row i moved by dx, dy, as an axis-aligned box (minx, miny, maxx, maxy)
+def labelBox(d, i, dx=0, dy=0):
+    fs = d.r[i]
+    width = len(d.texts[d.refs[i]]) * fs * CHAR_WIDTH
+    anchor = d.styleTable[d.styles[i]][0]
+    left = {"start": 0, "middle": -width / 2, "end": -width}.get(anchor, 0)
+    x = d.x0[i] + dx
+    y = d.y0[i] + dy
+    angle = d.x1[i] if d.y1[i] else 0
+    if angle % 360 == 0:
+        return x + left, y - fs * ASCENT, x + left + width, y + fs * DESCENT
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    xs = []
+    ys = []
+    for px, py in ((left, -fs * ASCENT), (left + width, -fs * ASCENT), (left, fs * DESCENT), (left + width, fs * DESCENT)):
+        xs.append(x + px * c - py * s)
+        ys.append(y + px * s + py * c)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# Moves to try for the text in row i, across its baseline by up to one line height
+def offsets(d, i):
+    angle = math.radians(d.x1[i]) if d.y1[i] else 0
+    nx = -math.sin(angle)
+    ny = math.cos(angle)
+    height = d.r[i] * (ASCENT + DESCENT)
+    result = [(0, 0)]
+    for k in (-0.5, 0.5, -1, 1):
+        result.append((nx * height * k, ny * height * k))
+    return result
+
+
+def overlaps(a, b):
+    return a[0] < b[2] - TOUCH and b[0] < a[2] - TOUCH and a[1] < b[3] - TOUCH and b[1] < a[3] - TOUCH
+
+
+# Keeps labels, only those of the given color if any, from piling up: bigger labels are placed first, then in
+# drawing order. A label that collides with one already placed is shifted across its baseline if that frees it,
+# and dropped otherwise. Run it before mergePaths() and useSymbols(). Returns the counts of kept, shifted and
+# dropped labels.
+def placeLabels(d, color=None, shift=True):
+    colorIdx = d.colorIndex.get(color)
+    rows = [i for i in range(len(d)) if d.kinds[i] == Drawer.TEXT and (color is None or d.colors[i] == colorIdx)]
+    if not rows:
+        return 0, 0, 0
+    rows.sort(key=lambda i: -d.r[i])
+    boxes = [labelBox(d, i) for i in rows]
+    index = GridIndex(max(sum(max(b[2] - b[0], b[3] - b[1]) for b in boxes) / len(boxes), 1e-3))
+    dropped = []
+    shifted = 0
+    for i, box in zip(rows, boxes):
+        for dx, dy in offsets(d, i) if shift else [(0, 0)]:
+            if dx or dy:
+                box = labelBox(d, i, dx, dy)
+            if not any(overlaps(box, index.boxes[k]) for k in index.query(*box)):
+                break
+        else:
+            dropped.append(i)
+            continue
+        if dx or dy:
+            d.x0[i] += dx
+            d.y0[i] += dy
+            shifted += 1
+        index.insert(i, *box)
+    d.removeRows(dropped)
+    return len(rows) - len(dropped), shifted, len(dropped)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import utils
+from cache import MAX_BYTES, SVGCache
+from export import WRITERS, writeFiles
+from jig import GENERATORS, poolMap
+from raster import writePNG
+from utils import openOutput
+
+# Per-process settings, set up by initWorker()
+cache = None
+precision = None
+svgz = False
+thumbnails = None
+formats = ['svg']
+
+
+# Reads a manifest: one parameter set per JSONL line or CSV row.
+# Besides generator parameters, a job can have a "kind" (jig or template) and a "name".
+def readManifest(path):
+    jobs = []
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                jobs.append({k: v for k, v in row.items() if v not in (None, "")})
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    jobs.append(json.loads(line))
+    for idx, job in enumerate(jobs):
+        job.setdefault('kind', 'jig')
+        job.setdefault('name', f"{idx:05d}-{job['kind']}")
+    return jobs
+
+
+# Splits a job into the generator and its parameters
+def jobParams(job):
+    kind = job['kind']
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown kind: {kind}")
+    params = {k: v for k, v in job.items() if k not in ('kind', 'name')}
+    return GENERATORS[kind], params
+
+
+# Renders a single job into outDir, returns its report entry
+def renderJob(job, outDir):
+    outputs = [os.path.join(outDir, job['name'] + (".svgz" if fmt == 'svg' and svgz else "." + fmt)) for fmt in formats]
+    result = {'name': job['name'], 'kind': job['kind'], 'output': outputs[0]}
+    if len(outputs) > 1:
+        result['outputs'] = outputs
+    start = time.perf_counter()
+    try:
+        generate, params = jobParams(job)
+        d = None
+        rest = outputs
+        if cache is not None and 'svg' in formats:
+            hits = cache.hits
+            data = cache.render(job['kind'], params, precision)
+            result['cached'] = cache.hits > hits
+            with openOutput(outputs[formats.index('svg')]) as f:
+                f.write(data.decode() + "\n")
+            rest = [path for path, fmt in zip(outputs, formats) if fmt != 'svg']
+        if rest:
+            # All other formats come from the same geometry, written in one pass
+            d = generate(params)
+            d.precision = precision
+            writeFiles(d, rest)
+        result['bytes'] = sum(os.path.getsize(path) for path in outputs)
+        if thumbnails:
+            result['thumbnail'] = os.path.join(outDir, job['name'] + ".png")
+            writePNG(d or generate(params), result['thumbnail'], thumbnails)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def initWorker(cacheDir=None, cacheBytes=None, outPrecision=None, compress=False, thumbnailSize=None,
+               outFormats=None):
+    global cache, precision, svgz, thumbnails, formats
+    utils.debug = False
+    precision = outPrecision
+    svgz = compress
+    thumbnails = thumbnailSize
+    formats = outFormats or ['svg']
+    if cacheDir:
+        cache = SVGCache(cacheDir, cacheBytes or MAX_BYTES)
+
+
+# Renders all jobs using a pool of worker processes, yields report entries in manifest order
+def renderAll(jobs, outDir, workers=None, render=renderJob, cacheDir=None, cacheBytes=None, precision=None,
+              svgz=False, thumbnails=None, formats=None):
+    os.makedirs(outDir, exist_ok=True)
+    yield from poolMap(render, jobs, [outDir] * len(jobs), workers=workers, initializer=initWorker,
+                       initargs=(cacheDir, cacheBytes, precision, svgz, thumbnails, formats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render many jigs and templates from a manifest.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest', help="JSONL or CSV file with one parameter set per line")
+    parser.add_argument('--outDir', default="out", help="Directory for the generated files")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, all cores if not given")
+    parser.add_argument('--report', help="Write per-job timings and failures to this JSON file")
+    parser.add_argument('--cacheDir', help="Reuse rendered SVGs from this cache directory")
+    parser.add_argument('--cacheBytes', type=int, default=MAX_BYTES, help="Cache size budget in bytes")
+    parser.add_argument('--precision', type=int, help="Decimals of coordinates in the output, full precision if not given")
+    parser.add_argument('--svgz', action="store_true", help="Write gzip-compressed .svgz files")
+    parser.add_argument('--formats', default="svg",
+                        help=f"Comma separated output formats, any of {','.join(WRITERS)}, all written from one geometry build")
+    parser.add_argument('--thumbnails', type=int, metavar="SIZE", help="Also write PNG previews, SIZE pixels wide or high")
+
+    args = parser.parse_args()
+    formats = args.formats.split(",")
+    unknown = set(formats) - set(WRITERS)
+    if unknown:
+        parser.error(f"Unknown formats: {', '.join(sorted(unknown))}")
+
+    jobs = readManifest(args.manifest)
+    start = time.perf_counter()
+    report = []
+    for result in renderAll(jobs, args.outDir, args.workers, cacheDir=args.cacheDir, cacheBytes=args.cacheBytes,
+                            precision=args.precision, svgz=args.svgz, thumbnails=args.thumbnails, formats=formats):
+        report.append(result)
+        if 'error' in result:
+            print(f"FAIL {result['name']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"ok   {result['name']} {result['seconds'] * 1000:.1f}ms {result['bytes']}B", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for r in report if 'error' in r)
+    summary = f"{len(report)} jobs, {failed} failed, {elapsed:.2f}s"
+    if args.cacheDir:
+        hits = sum(1 for r in report if r.get('cached'))
+        summary += f", {hits} cache hits, {len(report) - failed - hits} misses"
+    print(summary, file=sys.stderr)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({'seconds': elapsed, 'jobs': report}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import utils
+from jig import LAYERS, SHAPES, generate_jig
+from template import generate_template
+
+# Pin grids (steps, subSteps, stepSize, stepAngle), from the default jig up to 10^4 holes
+JIG_GRIDS = [
+    (6, 4, "1in", 2),
+    (20, 10, "10mm", 0.5),
+    (100, 20, "5mm", 0.2),
+    (500, 20, "4mm", 0.1),
+]
+
+# Template step sizes, from coarse to fine
+TEMPLATE_STEPS = ["10mm", "5mm", "2mm", "1mm", "0.5mm"]
+
+
+# Counts the characters written, without keeping them
+class NullWriter:
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, s):
+        self.size += len(s)
+
+
+def cases():
+    for shape in SHAPES:
+        for layers in LAYERS:
+            for steps, subSteps, stepSize, stepAngle in JIG_GRIDS:
+                params = {'shape': shape, 'layers': layers, 'steps': steps, 'subSteps': subSteps,
+                          'stepSize': stepSize, 'stepAngle': stepAngle}
+                yield f"jig-{shape}-{layers}-{steps * subSteps}", generate_jig, params
+    for fence in [False, True]:
+        for stepSize in TEMPLATE_STEPS:
+            params = {'stepSize': stepSize, 'fence': fence}
+            yield f"template-{'fence' if fence else 'plain'}-{stepSize}", generate_template, params
+
+
+def render(generate, params):
+    out = NullWriter()
+    generate(params).writeSVG(out)
+    return out.size
+
+
+# Times a case (best of repeat), then measures its peak memory in a separate traced run
+def measure(generate, params, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = render(generate, params)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    render(generate, params)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'peakBytes': peak, 'outputBytes': size}
+
+
+# Returns the cases slower than the baseline by more than threshold (relative)
+def regressions(results, baseline, threshold):
+    slow = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base and r['seconds'] > base['seconds'] * (1 + threshold):
+            slow.append((name, base['seconds'], r['seconds']))
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark jig and template generation.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--filter', default="", help="Only run cases whose name contains this string")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case, the best one is reported")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against results saved earlier with --save")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'case':<36} {'time':>10} {'peak':>10} {'output':>10} {'vs base':>8}")
+    for name, generate, params in cases():
+        if args.filter not in name:
+            continue
+        r = results[name] = measure(generate, params, args.repeat)
+        change = ""
+        if name in baseline:
+            change = f"{(r['seconds'] / baseline[name]['seconds'] - 1) * 100:+.0f}%"
+        print(f"{name:<36} {r['seconds'] * 1000:>8.1f}ms {r['peakBytes'] / 1024:>8.0f}KB "
+              f"{r['outputBytes'] / 1024:>8.0f}KB {change:>8}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    slow = regressions(results, baseline, args.threshold)
+    for name, before, after in slow:
+        print(f"REGRESSION {name}: {before * 1000:.1f}ms -> {after * 1000:.1f}ms", file=sys.stderr)
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: processes sharing a cache directory may overshoot its budget
+    fcntl = None
+
+import utils
+from jig import drawJig, jigParams
+from template import drawTemplate, templateParams
+
+# Default size budget of the cache directory
+MAX_BYTES = 256 << 20
+# Share of the budget left after an eviction, so that a full cache is not rescanned on every put
+EVICT_TO = 0.9
+# Lock file in the cache directory holding the byte total of its entries
+LOCK_FILE = "cache.lock"
+
+KINDS = {
+    'jig': (jigParams, drawJig),
+    'template': (templateParams, drawTemplate),
+}
+
+
+# Rounds floats so that equal dimensions given in different units hash the same,
+# e.g. 6in is 152.39999999999998 while 152.4mm is 152.4
+def normalized(v):
+    if isinstance(v, float):
+        return round(v, 9)
+    if isinstance(v, (list, tuple)):
+        return [normalized(x) for x in v]
+    if isinstance(v, dict):
+        return {k: normalized(x) for k, x in v.items()}
+    return v
+
+
+# Cache key for converted parameters, see jigParams() and templateParams()
+def cacheKey(kind, p, precision=None):
+    s = json.dumps({'kind': kind, 'version': utils.VERSION, 'params': normalized(p), 'precision': precision},
+                   sort_keys=True)
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+# Content-addressed store of rendered SVGs, evicting the least recently used
+# entries once the directory grows over maxBytes. Processes sharing the directory
+# keep its byte total in a lock file and update it under that lock.
+class SVGCache:
+
+    def __init__(self, directory, maxBytes=MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        with self.locked() as lock:
+            # Recount, the total is lost if a process died between writing a file and counting it
+            self.setSize(lock, sum(size for _, _, size in self.scan()))
+            self.evict(lock)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".svg")
+
+    # Entries on disk as (access time, key, size), oldest first
+    def scan(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".svg"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, entry.name[:-4], st.st_size))
+        return sorted(files)
+
+    # Holds the lock file of the directory, which also keeps the byte total of its entries
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self.directory, LOCK_FILE), "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def getSize(self, lock):
+        lock.seek(0)
+        s = lock.read().strip()
+        return int(s) if s else 0
+
+    def setSize(self, lock, size):
+        lock.seek(0)
+        lock.truncate()
+        lock.write(str(size))
+        lock.flush()
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            os.utime(self.path(key))
+            self.hits += 1
+            return data
+        except FileNotFoundError:
+            # Not rendered yet, or evicted by another process sharing the directory
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        tmp = self.path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self.locked() as lock:
+            try:
+                old = os.stat(self.path(key)).st_size
+            except FileNotFoundError:
+                old = 0
+            os.replace(tmp, self.path(key))
+            self.setSize(lock, self.getSize(lock) + len(data) - old)
+            self.evict(lock)
+
+    # Removes the oldest entries down to EVICT_TO of the budget once the total is over it, keeping the newest
+    def evict(self, lock):
+        size = self.getSize(lock)
+        if size <= self.maxBytes:
+            return
+        files = self.scan()
+        size = sum(s for _, _, s in files)
+        for _, key, s in files[:-1]:
+            if size <= self.maxBytes * EVICT_TO:
+                break
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            size -= s
+        self.setSize(lock, size)
+
+    # Returns the SVG bytes for a parameter set, rendering it only on a miss
+    def render(self, kind, params=None, precision=None):
+        paramsFn, drawFn = KINDS[kind]
+        p = paramsFn(params)
+        key = cacheKey(kind, p, precision)
+        data = self.get(key)
+        if data is None:
+            d = drawFn(p)
+            d.precision = precision
+            data = d.toSVG().encode()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        with self.locked() as lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.scan()), 'bytes': self.getSize(lock)}
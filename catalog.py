@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+
+import utils
+from batch import jobParams, readManifest
+from export import layerOf
+from jig import poolMap
+from utils import Drawer
+
+# Columns of a catalog with their .npy type: one row per primitive of every job, see Drawer for their meaning.
+# color, phase and ref index the colors, phases and texts of the catalog index, job its jobs.
+COLUMNS = {
+    'kind': ('B', '|u1'),
+    'x0': ('d', '<f8'),
+    'y0': ('d', '<f8'),
+    'x1': ('d', '<f8'),
+    'y1': ('d', '<f8'),
+    'r': ('d', '<f8'),
+    'color': ('H', '<u2'),
+    'phase': ('H', '<u2'),
+    'ref': ('I', '<u4'),
+    'job': ('I', '<u4'),
+}
+INDEX = "catalog.json"
+# Bytes reserved for each .npy header, so that it can be rewritten in place with the final row count
+HEADER_BYTES = 128
+
+
+def npyHeader(descr, rows):
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    header = header.ljust(HEADER_BYTES - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin-1")
+
+
+# Writes jobs into a directory of .npy files, one per column, that numpy.load() maps into memory without
+# parsing. Everything else, like colors, phases and texts, goes into catalog.json. Works without NumPy.
+class CatalogWriter:
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.files = {}
+        for name, (_, descr) in COLUMNS.items():
+            f = self.files[name] = open(os.path.join(directory, name + ".npy"), "wb")
+            f.write(npyHeader(descr, 0))
+        self.rows = 0
+        self.jobs = []
+        self.colors = []
+        self.colorIndex = {}
+        self.phases = []
+        self.phaseIndex = {}
+        self.texts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def intern(self, values, table, index):
+        ids = []
+        for v in values:
+            idx = index.get(v)
+            if idx is None:
+                idx = index[v] = len(table)
+                table.append(v)
+            ids.append(idx)
+        return ids
+
+    # Appends the columns of a Drawer, see drawerColumns()
+    def add(self, name, kind, columns):
+        n = len(columns['kind'])
+        colors = self.intern(columns['colorTable'], self.colors, self.colorIndex)
+        phases = self.intern([tuple(p) for p in columns['phaseTable']], self.phases, self.phaseIndex)
+        refs = columns['ref']
+        # Text rows point into the texts of the whole catalog
+        textRows = [i for i, k in enumerate(columns['kind']) if k == Drawer.TEXT]
+        if textRows:
+            refs = array('I', refs)
+            for i in textRows:
+                refs[i] += len(self.texts)
+        self.texts.extend(columns['texts'])
+        values = {
+            'kind': columns['kind'],
+            'x0': columns['x0'],
+            'y0': columns['y0'],
+            'x1': columns['x1'],
+            'y1': columns['y1'],
+            'r': columns['r'],
+            'color': array('H', [colors[c] for c in columns['color']]),
+            'phase': array('H', [phases[p] for p in columns['phase']]),
+            'ref': refs,
+            'job': array('I', [len(self.jobs)]) * n,
+        }
+        for column, (typecode, _) in COLUMNS.items():
+            a = values[column]
+            if not isinstance(a, array) or a.typecode != typecode:
+                a = array(typecode, a)
+            if sys.byteorder == "big":
+                a = array(typecode, a)
+                a.byteswap()
+            a.tofile(self.files[column])
+        self.jobs.append({'name': name, 'kind': kind, 'start': self.rows, 'rows': n})
+        self.rows += n
+
+    def close(self):
+        for name, (_, descr) in COLUMNS.items():
+            f = self.files[name]
+            f.seek(0)
+            f.write(npyHeader(descr, self.rows))
+            f.close()
+        index = {
+            'version': utils.VERSION,
+            'rows': self.rows,
+            'columns': {name: descr for name, (_, descr) in COLUMNS.items()},
+            'kinds': Drawer.KIND_NAMES,
+            'colors': self.colors,
+            'layers': [layerOf(c)[0] for c in self.colors],
+            'phases': self.phases,
+            'texts': self.texts,
+            'jobs': self.jobs,
+        }
+        with open(os.path.join(self.directory, INDEX), "w") as f:
+            json.dump(index, f)
+
+
+# Columns of a Drawer with its own color, phase and text tables, as passed to CatalogWriter.add()
+def drawerColumns(d):
+    return {
+        'kind': d.kinds, 'x0': d.x0, 'y0': d.y0, 'x1': d.x1, 'y1': d.y1, 'r': d.r,
+        'color': d.colors, 'phase': d.phaseIds, 'ref': d.refs,
+        'colorTable': d.colorTable, 'phaseTable': d.phaseTable, 'texts': d.texts,
+    }
+
+
+# Generates a single job in a worker process, returns (name, kind, columns, error)
+def generateJob(job):
+    try:
+        generate, params = jobParams(job)
+        return job['name'], job['kind'], drawerColumns(generate(params)), None
+    except Exception as e:
+        return job['name'], job['kind'], None, f"{type(e).__name__}: {e}"
+
+
+def initWorker():
+    utils.debug = False
+
+
+# Generates all jobs across a pool of worker processes and writes them into a catalog directory.
+# Yields (name, error) in manifest order.
+def buildCatalog(jobs, directory, workers=None):
+    with CatalogWriter(directory) as writer:
+        for name, kind, columns, error in poolMap(generateJob, jobs, workers=workers, initializer=initWorker):
+            if columns is not None:
+                writer.add(name, kind, columns)
+            yield name, error
+
+
+# Read side of a catalog. Columns are NumPy arrays mapped from the .npy files on first use, so opening
+# a catalog of thousands of jigs only reads catalog.json. NumPy is only needed here.
+class Catalog:
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            self.index = json.load(f)
+        self.columns = {}
+
+    def __len__(self):
+        return self.index['rows']
+
+    def __getitem__(self, column):
+        a = self.columns.get(column)
+        if a is None:
+            if column not in COLUMNS:
+                raise KeyError(column)
+            import numpy
+            a = self.columns[column] = numpy.load(os.path.join(self.directory, column + ".npy"), mmap_mode="r")
+        return a
+
+    @property
+    def jobs(self):
+        return self.index['jobs']
+
+    # Rows of the job with the given name, as a slice of the columns
+    def jobRows(self, name):
+        for job in self.index['jobs']:
+            if job['name'] == name:
+                return slice(job['start'], job['start'] + job['rows'])
+        raise KeyError(name)
+
+    # Boolean mask of the rows matching all given conditions, by name: kind ("circle"), color ("red"),
+    # layer ("CUT"), phase ("generatePins") and job name. Each condition can also be a list of names.
+    def select(self, kind=None, color=None, layer=None, phase=None, job=None):
+        import numpy
+        mask = numpy.ones(len(self), dtype=bool)
+
+        def ids(values, wanted):
+            wanted = [wanted] if isinstance(wanted, str) else wanted
+            return [k for k, v in enumerate(values) if v in wanted]
+
+        if kind is not None:
+            mask &= numpy.isin(self['kind'], ids(self.index['kinds'], kind))
+        if color is not None:
+            mask &= numpy.isin(self['color'], ids(self.index['colors'], color))
+        if layer is not None:
+            mask &= numpy.isin(self['color'], ids(self.index['layers'], layer))
+        if phase is not None:
+            mask &= numpy.isin(self['phase'], ids([name for name, _ in self.index['phases']], phase))
+        if job is not None:
+            mask &= numpy.isin(self['job'], ids([j['name'] for j in self.index['jobs']], job))
+        return mask
+
+    def text(self, row):
+        return self.index['texts'][int(self['ref'][row])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the geometry of many jigs and templates into a columnar catalog.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest', help="JSONL or CSV file with one parameter set per line, see batch.py")
+    parser.add_argument('--outDir', default="catalog", help="Directory for the .npy columns and catalog.json")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, all cores if not given")
+
+    args = parser.parse_args()
+
+    jobs = readManifest(args.manifest)
+    start = time.perf_counter()
+    failed = 0
+    for name, error in buildCatalog(jobs, args.outDir, args.workers):
+        if error:
+            failed += 1
+            print(f"FAIL {name}: {error}", file=sys.stderr)
+    with open(os.path.join(args.outDir, INDEX)) as f:
+        rows = json.load(f)['rows']
+    print(f"{len(jobs)} jobs, {failed} failed, {rows} primitives, {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import sys
+
+import utils
+from jig import generate, parseParams
+from paths import TOLERANCE, cutRows, segmentEnds
+from utils import Drawer, GridIndex, UnionFind, arcSweep
+
+# Largest distance between an arc and the segments it is checked as, in mm
+FLATTEN_TOLERANCE = 0.01
+
+
+# Splits the CUT rows into circles (cx, cy, r) and segments (x0, y0, x1, y1), arcs become short segments.
+# Returns a list of (row, kind, geometry).
+def features(d, rows, tol=FLATTEN_TOLERANCE):
+    result = []
+    for i in rows:
+        kind = d.kinds[i]
+        if kind == Drawer.CIRCLE:
+            result.append((i, kind, (d.x0[i], d.y0[i], d.r[i])))
+        elif kind == Drawer.LINE:
+            result.append((i, kind, (d.x0[i], d.y0[i], d.x1[i], d.y1[i])))
+        else:
+            cx, cy, r, start = d.x0[i], d.y0[i], d.r[i], d.x1[i]
+            sweep = arcSweep(d, i)
+            step = 2 * math.acos(max(-1, 1 - tol / r)) if r > tol else sweep
+            n = max(1, math.ceil(sweep / step))
+            points = [(cx + math.cos(start + sweep * k / n) * r, cy + math.sin(start + sweep * k / n) * r)
+                      for k in range(n + 1)]
+            for p0, p1 in zip(points, points[1:]):
+                result.append((i, Drawer.LINE, p0 + p1))
+    return result
+
+
+# Groups rows whose end points touch each other. A line or arc ending on another cut, a T-junction,
+# is not joined here, see endsOn(). Returns the group of each row.
+def connected(d, rows, tol=TOLERANCE):
+    sets = UnionFind(rows)
+    ends = {}
+    for i in rows:
+        if d.kinds[i] == Drawer.CIRCLE:
+            continue
+        for p in segmentEnds(d, i):
+            cx, cy = round(p[0] / tol), round(p[1] / tol)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j, q in ends.get((cx + dx, cy + dy), ()):
+                        if math.dist(p, q) <= tol:
+                            sets.union(i, j)
+            ends.setdefault((cx, cy), []).append((i, p))
+    return {i: sets.find(i) for i in rows}
+
+
+def box(kind, g):
+    if kind == Drawer.CIRCLE:
+        return g[0] - g[2], g[1] - g[2], g[0] + g[2], g[1] + g[2]
+    return min(g[0], g[2]), min(g[1], g[3]), max(g[0], g[2]), max(g[1], g[3])
+
+
+# Closest point to p on the segment a-b
+def closestOnSegment(p, a, b):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length2 = dx * dx + dy * dy
+    t = 0 if length2 == 0 else max(0, min(1, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length2))
+    return a[0] + t * dx, a[1] + t * dy
+
+
+def midPoint(p, q):
+    return (p[0] + q[0]) / 2, (p[1] + q[1]) / 2
+
+
+# Point on the circle around c with radius r, in the direction of p
+def towards(c, r, p):
+    dist = math.dist(c, p)
+    if dist == 0:
+        return c[0] + r, c[1]
+    return c[0] + (p[0] - c[0]) * r / dist, c[1] + (p[1] - c[1]) * r / dist
+
+
+def circleCircle(g1, g2):
+    c1, r1 = g1[:2], g1[2]
+    c2, r2 = g2[:2], g2[2]
+    dist = math.dist(c1, c2)
+    if dist >= r1 + r2:
+        return dist - r1 - r2, midPoint(towards(c1, r1, c2), towards(c2, r2, c1))
+    if dist <= abs(r1 - r2):
+        # One inside the other, closest where the inner one is closest to the outer one
+        inner, outer = (g1, g2) if r1 < r2 else (g2, g1)
+        away = (2 * inner[0] - outer[0], 2 * inner[1] - outer[1]) if dist else (inner[0] + 1, inner[1])
+        return abs(r1 - r2) - dist, midPoint(towards(inner[:2], inner[2], away), towards(outer[:2], outer[2], away))
+    return 0, midPoint(towards(c1, r1, c2), towards(c2, r2, c1))
+
+
+def circleSegment(g1, g2):
+    c, r = g1[:2], g1[2]
+    a, b = g2[:2], g2[2:]
+    near = closestOnSegment(c, a, b)
+    far = max((a, b), key=lambda p: math.dist(c, p))
+    nearDist = math.dist(c, near)
+    farDist = math.dist(c, far)
+    if nearDist >= r:
+        return nearDist - r, midPoint(near, towards(c, r, near))
+    if farDist <= r:
+        return r - farDist, midPoint(far, towards(c, r, far))
+    return 0, near
+
+
+def segmentSegment(g1, g2):
+    a, b = g1[:2], g1[2:]
+    c, e = g2[:2], g2[2:]
+    # Proper crossing
+    d1 = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    d2 = (b[0] - a[0]) * (e[1] - a[1]) - (b[1] - a[1]) * (e[0] - a[0])
+    d3 = (e[0] - c[0]) * (a[1] - c[1]) - (e[1] - c[1]) * (a[0] - c[0])
+    d4 = (e[0] - c[0]) * (b[1] - c[1]) - (e[1] - c[1]) * (b[0] - c[0])
+    if ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 != d2:
+        t = d1 / (d1 - d2)
+        return 0, (c[0] + t * (e[0] - c[0]), c[1] + t * (e[1] - c[1]))
+    return min((math.dist(p, q), midPoint(p, q)) for p, q in
+               [(a, closestOnSegment(a, c, e)), (b, closestOnSegment(b, c, e)),
+                (c, closestOnSegment(c, a, b)), (e, closestOnSegment(e, a, b))])
+
+
+# Distance between two features, and roughly where it is smallest
+def distance(kind1, g1, kind2, g2):
+    if kind1 == Drawer.CIRCLE and kind2 == Drawer.CIRCLE:
+        return circleCircle(g1, g2)
+    if kind1 == Drawer.CIRCLE:
+        return circleSegment(g1, g2)
+    if kind2 == Drawer.CIRCLE:
+        return circleSegment(g2, g1)
+    return segmentSegment(g1, g2)
+
+
+# Whether a line or arc of one row ends on the other feature, like an arc ending on a straight cut
+def endsOn(d, i, kind, g, tol=TOLERANCE):
+    if d.kinds[i] == Drawer.CIRCLE:
+        return False
+    return any(distance(Drawer.CIRCLE, p + (0,), kind, g)[0] <= tol for p in segmentEnds(d, i))
+
+
+def describe(d, i):
+    name, layer = d.phaseTable[d.phaseIds[i]]
+    return {'row': i, 'kind': Drawer.KIND_NAMES[d.kinds[i]], 'phase': name, 'layer': layer}
+
+
+# Finds CUT features closer to each other than clearance. Lines and arcs touching at their end points,
+# or ending on another cut, are joined by design and not checked against each other. Returns one violation per pair of rows,
+# closest first, with the distance and the location where the features are closest.
+def checkClearance(d, clearance, color=Drawer.CUT):
+    rows = cutRows(d, color)
+    group = connected(d, rows)
+    items = features(d, rows)
+    boxes = [box(kind, g) for _, kind, g in items]
+    area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+    index = GridIndex(max(clearance, math.sqrt(area / len(items)) if items else 1, 1e-3))
+    for k, b in enumerate(boxes):
+        index.insert(k, *b)
+    worst = {}
+    joined = set()
+    for k, (i, kind, g) in enumerate(items):
+        for j in index.query(*boxes[k], clearance):
+            if j <= k:
+                continue
+            i2, kind2, g2 = items[j]
+            if group[i] == group[i2]:
+                continue
+            dist, at = distance(kind, g, kind2, g2)
+            pair = (min(i, i2), max(i, i2))
+            if dist <= TOLERANCE and (endsOn(d, i, kind2, g2) or endsOn(d, i2, kind, g)):
+                joined.add(pair)
+            elif dist < clearance and (pair not in worst or dist < worst[pair][0]):
+                worst[pair] = (dist, at)
+    return [{'distance': dist, 'x': at[0], 'y': at[1], 'a': describe(d, i), 'b': describe(d, i2)}
+            for (i, i2), (dist, at) in sorted(worst.items(), key=lambda item: item[1][0]) if (i, i2) not in joined]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the cuts of a jig or template keep a minimum clearance.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('kind', choices=["jig", "template"], help="What to generate")
+    parser.add_argument('params', nargs="*", help="Generator options as name=value, e.g. shape=narrow")
+    parser.add_argument('--clearance', type=str, default="1mm", help="Smallest allowed distance between cuts")
+    parser.add_argument('--report', help="Write all violations to this JSON file")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    d = generate(args.kind, parseParams(args.params))
+    violations = checkClearance(d, utils.unit(args.clearance))
+
+    for v in violations:
+        a, b = v['a'], v['b']
+        print(f"{v['distance']:.3f}mm at ({v['x']:.2f}, {v['y']:.2f}): "
+              f"{a['kind']} of {a['phase']}/{a['layer']} and {b['kind']} of {b['phase']}/{b['layer']}")
+    print(f"{len(violations)} violations of {args.clearance} clearance", file=sys.stderr)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(violations, f, indent=2)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
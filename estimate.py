@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+
+import utils
+from batch import jobParams, readManifest
+from gcode import toolpath, travel
+from jig import poolMap
+from paths import cutRows, rowLength
+
+# Rapid feed assumed for G0 moves, mm/min
+RAPID = 5000
+
+# Report columns, in CSV order
+FIELDS = ['name', 'kind', 'contours', 'plunges', 'cutLength', 'rapidLength', 'cutMinutes', 'plungeMinutes',
+          'rapidMinutes', 'minutes', 'error']
+
+# Per-process machine settings, set up by initWorker()
+settings = {}
+
+
+# Cut length, plunges and machining time of the CUT geometry of a Drawer, cut in the order gcode.py uses:
+# for each contour a rapid move to its start, a plunge from the safe height to depth, the cut at feed
+# and a rapid retract. Lengths are in mm, feeds in mm/min, times in minutes.
+def estimate(d, depth=6, safe=5, feed=1000, plunge=300, rapid=RAPID):
+    rows = cutRows(d)
+    lengths = [rowLength(d, i) for i in rows]
+    order, _, _ = toolpath(d, rows)
+    rapidLength = travel(order, (0, 0))[0]
+    plunges = len(order)
+    cutLength = math.fsum(lengths)
+    cutMinutes = cutLength / feed
+    plungeMinutes = plunges * (safe + depth) / plunge
+    rapidMinutes = (rapidLength + plunges * (safe + depth)) / rapid
+    phases = {}
+    for i, length in zip(rows, lengths):
+        name = d.phaseTable[d.phaseIds[i]][0] or "-"
+        phases[name] = phases.get(name, 0) + length
+    return {
+        'contours': len(order),
+        'plunges': plunges,
+        'cutLength': cutLength,
+        'rapidLength': rapidLength,
+        'cutMinutes': cutMinutes,
+        'plungeMinutes': plungeMinutes,
+        'rapidMinutes': rapidMinutes,
+        'minutes': cutMinutes + plungeMinutes + rapidMinutes,
+        'phaseCutLength': phases,
+    }
+
+
+def initWorker(machine):
+    utils.debug = False
+    settings.update(machine)
+
+
+# Generates and estimates a single job in a worker process, returns its report entry
+def estimateJob(job):
+    result = {'name': job['name'], 'kind': job['kind']}
+    try:
+        generate, params = jobParams(job)
+        result.update(estimate(generate(params), **settings))
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# Estimates all jobs using a pool of worker processes, yields report entries in manifest order
+def estimateAll(jobs, machine, workers=None):
+    yield from poolMap(estimateJob, jobs, workers=workers, initializer=initWorker, initargs=(machine,))
+
+
+def writeCSV(report, out):
+    writer = csv.DictWriter(out, FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for r in report:
+        writer.writerow({k: f"{v:.3f}" if isinstance(v, float) else v for k, v in r.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate cut length, plunges and machining time of many jigs and templates.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest', help="JSONL or CSV file with one parameter set per line, see batch.py")
+    parser.add_argument('--output', help="Report file, CSV or JSON by extension, CSV on stdout if not given")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, all cores if not given")
+    parser.add_argument('--depth', type=str, default="6mm", help="Cut depth")
+    parser.add_argument('--safe', type=str, default="5mm", help="Safe height for rapid moves")
+    parser.add_argument('--feed', type=float, default=1000, help="Cutting feed, mm/min")
+    parser.add_argument('--plunge', type=float, default=300, help="Plunge feed, mm/min")
+    parser.add_argument('--rapid', type=float, default=RAPID, help="Rapid feed, mm/min")
+
+    args = parser.parse_args()
+    machine = {'depth': utils.unit(args.depth), 'safe': utils.unit(args.safe), 'feed': args.feed,
+               'plunge': args.plunge, 'rapid': args.rapid}
+
+    jobs = readManifest(args.manifest)
+    start = time.perf_counter()
+    report = []
+    for result in estimateAll(jobs, machine, args.workers):
+        report.append(result)
+        if 'error' in result:
+            print(f"FAIL {result['name']}: {result['error']}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    if args.output and args.output.endswith(".json"):
+        with open(args.output, "w") as f:
+            json.dump({'seconds': elapsed, 'machine': machine, 'jobs': report}, f, indent=2)
+    elif args.output:
+        with open(args.output, "w", newline="") as f:
+            writeCSV(report, f)
+    else:
+        writeCSV(report, sys.stdout)
+
+    failed = sum(1 for r in report if 'error' in r)
+    total = sum(r.get('minutes', 0) for r in report)
+    print(f"{len(report)} jobs, {failed} failed, {total:.1f} machine minutes, {elapsed:.2f}s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+import io
+import json
+import math
+import os
+import sys
+import time
+
+import utils
+from annotations import placeLabels
+from paths import mergePaths
+from symbols import useSymbols
+from utils import Drawer, Profiler, VERSION, openOutput, validateSVG
+
+# Output layer and DXF color number of each Drawer color
+LAYERS = {
+    Drawer.CUT: ("CUT", 1),
+    Drawer.MARK: ("MARK", 5),
+    Drawer.GUIDE: ("GUIDE", 3),
+    Drawer.DBG: ("DEBUG", 8),
+}
+# Layer of anything drawn in another color
+OTHER_LAYER = ("0", 7)
+
+# Output format by file extension
+EXTENSIONS = {
+    ".svg": "svg",
+    ".svgz": "svg",
+    ".dxf": "dxf",
+    ".json": "json",
+}
+
+# Horizontal text alignment in DXF by SVG text-anchor
+DXF_ALIGN = {"start": 0, "middle": 1, "end": 2}
+
+
+# Output format of a path, SVG unless it has one of the other extensions, like /dev/null
+def formatOf(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return EXTENSIONS.get(os.path.splitext(name)[1].lower(), 'svg')
+
+
+def layerOf(color):
+    return LAYERS.get(color, OTHER_LAYER)
+
+
+# Size of the page, as in the SVG header
+def pageSize(d):
+    return math.ceil(d.bounds[2] + d.margin), math.ceil(d.bounds[3] + d.margin)
+
+
+# Each writer turns ranges of Drawer rows into one format, one string per row, see emit()
+class SVGWriter:
+
+    def __init__(self, d):
+        self.d = d
+
+    def begin(self):
+        return self.d.header()
+
+    def rows(self, start, end):
+        markup = self.d.markup
+        return [markup(i) for i in range(start, end)]
+
+    def end(self):
+        return "</svg>\n"
+
+
+# AutoCAD R12 DXF, which every CAM program reads. Coordinates are in mm with y pointing up, so the page
+# is flipped vertically: arcs run counter-clockwise and text rotates the other way than in the SVG.
+# R12 has no $INSUNITS, CAM programs ask for the units on import.
+class DXFWriter:
+
+    def __init__(self, d):
+        self.d = d
+        self.height = pageSize(d)[1]
+        self.layers = [layerOf(c)[0] for c in d.colorTable]
+
+    def begin(self):
+        used = {}
+        for c in self.d.colorTable:
+            name, color = layerOf(c)
+            used[name] = color
+        parts = ["0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n0\nENDSEC\n",
+                 f"0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n{len(used)}\n"]
+        for name, color in used.items():
+            parts.append(f"0\nLAYER\n2\n{name}\n70\n0\n62\n{color}\n6\nCONTINUOUS\n")
+        parts.append("0\nENDTAB\n0\nENDSEC\n0\nSECTION\n2\nENTITIES\n")
+        return "".join(parts)
+
+    def rows(self, start, end):
+        d = self.d
+        n = d.num
+        h = self.height
+        parts = []
+        for i in range(start, end):
+            kind = d.kinds[i]
+            layer = self.layers[d.colors[i]]
+            x = n(d.x0[i])
+            y = n(h - d.y0[i])
+            if kind == Drawer.LINE:
+                parts.append(f"0\nLINE\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0\n11\n{n(d.x1[i])}\n21\n{n(h - d.y1[i])}\n31\n0\n")
+            elif kind == Drawer.CIRCLE:
+                parts.append(f"0\nCIRCLE\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0\n40\n{n(d.r[i])}\n")
+            elif kind == Drawer.ARC:
+                # Flipping y reverses the direction, the arc now runs from the old end angle to the old start
+                startAngle = -math.degrees(d.y1[i]) % 360
+                endAngle = -math.degrees(d.x1[i]) % 360
+                parts.append(f"0\nARC\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0\n40\n{n(d.r[i])}\n"
+                             f"50\n{n(startAngle)}\n51\n{n(endAngle)}\n")
+            else:
+                text = d.texts[d.refs[i]].replace("\n", " ")
+                rotation = -d.x1[i] if d.y1[i] else 0
+                align = DXF_ALIGN.get(d.styleTable[d.styles[i]][0], 0)
+                entity = f"0\nTEXT\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0\n40\n{n(d.r[i])}\n1\n{text}\n"
+                if rotation:
+                    entity += f"50\n{n(rotation % 360)}\n"
+                if align:
+                    entity += f"72\n{align}\n11\n{x}\n21\n{y}\n31\n0\n"
+                parts.append(entity)
+        return parts
+
+    def end(self):
+        return "0\nENDSEC\n0\nEOF\n"
+
+
+# Raw geometry as JSON, one object per primitive in page coordinates (mm, y pointing down like the SVG).
+# Arcs run from startAngle in the direction of increasing angle to endAngle, in degrees.
+class JSONWriter:
+
+    def __init__(self, d):
+        self.d = d
+        self.layers = [layerOf(c)[0] for c in d.colorTable]
+        precision = d.precision
+        self.round = (lambda v: v) if precision is None else (lambda v: round(v, precision))
+        self.first = True
+
+    def begin(self):
+        width, height = pageSize(self.d)
+        layers = sorted(set(self.layers))
+        return (f'{{"version": {VERSION}, "units": "mm", "width": {width}, "height": {height}, '
+                f'"layers": {json.dumps(layers)}, "entities": [')
+
+    def entity(self, i):
+        d = self.d
+        r = self.round
+        kind = d.kinds[i]
+        e = {'type': Drawer.KIND_NAMES[kind], 'layer': self.layers[d.colors[i]], 'phase': d.phaseTable[d.phaseIds[i]][0]}
+        if kind == Drawer.LINE:
+            e['start'] = [r(d.x0[i]), r(d.y0[i])]
+            e['end'] = [r(d.x1[i]), r(d.y1[i])]
+        elif kind == Drawer.TEXT:
+            e['position'] = [r(d.x0[i]), r(d.y0[i])]
+            e['height'] = r(d.r[i])
+            e['rotation'] = r(d.x1[i]) if d.y1[i] else 0
+            e['anchor'] = d.styleTable[d.styles[i]][0]
+            e['text'] = d.texts[d.refs[i]]
+        else:
+            e['center'] = [r(d.x0[i]), r(d.y0[i])]
+            e['radius'] = r(d.r[i])
+            if kind == Drawer.ARC:
+                e['startAngle'] = r(math.degrees(d.x1[i]))
+                e['endAngle'] = r(math.degrees(d.y1[i]))
+        return e
+
+    def rows(self, start, end):
+        parts = [",\n" + json.dumps(self.entity(i)) for i in range(start, end)]
+        if parts and self.first:
+            parts[0] = parts[0][1:]
+            self.first = False
+        return parts
+
+    def end(self):
+        return "\n]}\n"
+
+
+WRITERS = {
+    'svg': SVGWriter,
+    'dxf': DXFWriter,
+    'json': JSONWriter,
+}
+
+
+# Writes the Drawer in several formats in one walk over its rows: outputs is a list of (format, file object).
+# A profiler attached to the Drawer gets the bytes of every format, see Profiler.count().
+def emit(d, outputs, validate=False):
+    profiler = d.profiler
+    started = time.perf_counter()
+    writers = [WRITERS[fmt](d) for fmt, _ in outputs]
+    # Validation needs the whole document
+    files = [io.StringIO() if validate and fmt == 'svg' else out for fmt, out in outputs]
+    for w, f in zip(writers, files):
+        s = w.begin()
+        f.write(s)
+        if profiler:
+            profiler.serializeBytes += len(s)
+    n = len(d)
+    for start in range(0, n, d.CHUNK):
+        end = min(start + d.CHUNK, n)
+        for w, f in zip(writers, files):
+            parts = w.rows(start, end)
+            if profiler:
+                profiler.count(d, start, parts)
+            f.write("".join(parts))
+    for w, f in zip(writers, files):
+        s = w.end()
+        f.write(s)
+        if profiler:
+            profiler.serializeBytes += len(s)
+    for (_, out), f in zip(outputs, files):
+        if f is not out:
+            s = f.getvalue()
+            validateSVG(s)
+            out.write(s)
+    if profiler:
+        profiler.serializeSeconds += time.perf_counter() - started
+
+
+# Writes the Drawer to every path, in the format given by its extension (.svg, .svgz, .dxf, .json)
+def writeFiles(d, paths, validate=False):
+    files = [openOutput(p) for p in paths]
+    try:
+        emit(d, [(formatOf(p), f) for p, f in zip(paths, files)], validate)
+    finally:
+        for f in files:
+            f.close()
+
+
+# Output options shared by the generator scripts, see outputProfiler() and finish()
+def addOutputArgs(parser):
+    parser.add_argument('--output', nargs="+",
+                        help="Write to these files instead of stdout, SVG, DXF or JSON by extension, gzip-compressed if named *.svgz")
+    parser.add_argument('--precision', type=int, help="Decimals of coordinates in the output, full precision if not given")
+    parser.add_argument('--validate', action="store_true", help="Check that the output is well-formed XML")
+    parser.add_argument('--placeLabels', action="store_true",
+                        help="Shift or drop labels that would overlap other labels")
+    parser.add_argument('--mergePaths', action="store_true", help="Join touching cut lines and arcs into single paths")
+    parser.add_argument('--symbols', action="store_true",
+                        help="Emit repeated geometry once in <defs> and reference it with <use>")
+    parser.add_argument('--profile', nargs="?", const="text", choices=["text", "json"],
+                        help="Report time, primitives and bytes per phase on stderr")
+
+
+# Profiler to generate with if --profile is given, else None
+def outputProfiler(args):
+    if args.profile == "json":
+        # Keep stderr machine-readable
+        utils.debug = False
+    return Profiler() if args.profile else None
+
+
+# Runs the passes selected by the output options on a generated Drawer, writes it and reports the profile
+def finish(d, args):
+    # Before the passes, which size their output at this precision
+    d.precision = args.precision
+
+    if args.placeLabels:
+        kept, shifted, dropped = placeLabels(d)
+        utils.dbg(f"Labels: {kept} kept, {shifted} of them shifted, {dropped} dropped")
+
+    if args.mergePaths:
+        before, after = mergePaths(d)
+        utils.dbg(f"Merged paths: {before} elements before, {after} after")
+
+    if args.symbols:
+        before, after = useSymbols(d)
+        utils.dbg(f"Symbols: {before} elements before, {after} after")
+
+    if args.output:
+        writeFiles(d, args.output, validate=args.validate)
+    else:
+        d.writeSVG(sys.stdout, validate=args.validate)
+        print()
+
+    if d.profiler:
+        print(d.profiler.format(d, args.profile), file=sys.stderr)
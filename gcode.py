@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import sys
+
+import utils
+from jig import generate, parseParams
+from paths import contourBox, contours, cutRows, segmentEnds
+from utils import Drawer, GridIndex, arcSweep
+
+# Neighbours considered per hole by 2-opt
+NEIGHBOURS = 8
+# Passes of 2-opt over the whole tour at most
+PASSES = 20
+# Contour ends left under which the closest one is found by checking them all. The grid search
+# would walk many empty cells to find the last few ends.
+SCAN = 64
+
+
+# Nesting depth of each contour: how many other contour boxes contain its box
+def depths(boxes):
+    n = len(boxes)
+    if n == 0:
+        return []
+    area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+    index = GridIndex(max(1, math.sqrt(area / n)))
+    for k, b in enumerate(boxes):
+        index.insert(k, *b)
+    result = []
+    for k, (x0, y0, x1, y1) in enumerate(boxes):
+        depth = 0
+        for j in index.query(x0, y0, x1, y1):
+            b = boxes[j]
+            if j != k and b[0] <= x0 and b[1] <= y0 and b[2] >= x1 and b[3] >= y1 and b != boxes[k]:
+                depth += 1
+        result.append(depth)
+    return result
+
+
+# Rapid travel from pos through all contours in order, returns the distance and the final position
+def travel(order, pos):
+    total = 0
+    for c in order:
+        total += math.dist(pos, c.start)
+        pos = c.end
+    return total, pos
+
+
+# Greedy tour: always go to the closest contour end. Open contours may be entered from either end.
+def nearestNeighbour(nodes, pos):
+    if not nodes:
+        return []
+    xs = [p[0] for c in nodes for p in (c.start, c.end)]
+    ys = [p[1] for c in nodes for p in (c.start, c.end)]
+    extent = max(max(xs) - min(xs), max(ys) - min(ys), 1)
+    cell = max(extent / math.sqrt(len(nodes)), 1e-3)
+    index = GridIndex(cell)
+    for k, c in enumerate(nodes):
+        index.insert((k, False), c.start[0], c.start[1], c.start[0], c.start[1])
+        if not c.closed:
+            index.insert((k, True), c.end[0], c.end[1], c.end[0], c.end[1])
+    order = []
+    while index.boxes:
+        if len(index.boxes) <= SCAN:
+            best = min((math.dist(pos, box[:2]), key) for key, box in index.boxes.items())
+        else:
+            radius = cell
+            while True:
+                found = index.query(pos[0], pos[1], pos[0], pos[1], radius)
+                best = None
+                for key in found:
+                    x, y, _, _ = index.boxes[key]
+                    dist = math.dist(pos, (x, y))
+                    if dist <= radius and (best is None or dist < best[0]):
+                        best = (dist, key)
+                if best is not None:
+                    break
+                if radius > 2 * extent + math.dist(pos, (xs[0], ys[0])):
+                    # Everything left is found, but in the corners of the search box
+                    best = min((math.dist(pos, index.boxes[key][:2]), key) for key in found)
+                    break
+                radius *= 2
+        k, rev = best[1]
+        index.remove((k, False))
+        if not nodes[k].closed:
+            index.remove((k, True))
+        c = nodes[k].reversed() if rev else nodes[k]
+        order.append(c)
+        pos = c.end
+    return order
+
+
+# Improves a tour of closed contours starting at pos by reversing sub-tours (2-opt),
+# only trying to connect each contour to its nearest neighbours
+def twoOpt(order, pos, neighbours=NEIGHBOURS, passes=PASSES):
+    n = len(order)
+    if n < 4 or not all(c.closed for c in order):
+        return order
+    points = [c.start for c in order]
+    tour = list(range(n))
+    at = list(range(n))
+    index = GridIndex(max(1e-3, math.sqrt(
+        (max(p[0] for p in points) - min(p[0] for p in points) + 1) *
+        (max(p[1] for p in points) - min(p[1] for p in points) + 1) / n)))
+    for k, p in enumerate(points):
+        index.insert(k, p[0], p[1], p[0], p[1])
+    near = []
+    for k, p in enumerate(points):
+        radius = index.cell
+        found = index.query(p[0], p[1], p[0], p[1], radius)
+        while len(found) <= neighbours and len(found) < n:
+            radius *= 2
+            found = index.query(p[0], p[1], p[0], p[1], radius)
+        near.append(sorted((j for j in found if j != k), key=lambda j: math.dist(p, points[j]))[:neighbours])
+
+    def point(t):
+        return pos if t < 0 else points[tour[t]]
+
+    for _ in range(passes):
+        improved = False
+        for i in range(n):
+            a = point(i - 1)
+            ta = tour[i - 1] if i > 0 else None
+            for c in near[ta] if ta is not None else []:
+                j = at[c]
+                if j <= i:
+                    continue
+                # Reverse tour[i..j], connecting a to c
+                before = math.dist(a, point(i)) + (math.dist(point(j), point(j + 1)) if j + 1 < n else 0)
+                after = math.dist(a, point(j)) + (math.dist(point(i), point(j + 1)) if j + 1 < n else 0)
+                if after < before - 1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1]
+                    for k in range(i, j + 1):
+                        at[tour[k]] = k
+                    improved = True
+        if not improved:
+            break
+    return [order[k] for k in tour]
+
+
+# Orders the contours of the given rows for cutting: the deepest nested features first, so that
+# holes are cut before the outline around them, each nesting level as a short tour.
+# Returns the ordered contours and the rapid distances of (drawing order, optimized order).
+def toolpath(d, rows):
+    cs = contours(d, rows)
+    drawingOrder = sorted(cs, key=lambda c: min(i for i, _ in c.rows))
+    levels = {}
+    for c, depth in zip(cs, depths([contourBox(d, c) for c in cs])):
+        levels.setdefault(depth, []).append(c)
+    order = []
+    pos = (0, 0)
+    for depth in sorted(levels, reverse=True):
+        tour = twoOpt(nearestNeighbour(levels[depth], pos), pos)
+        order.extend(tour)
+        _, pos = travel(tour, pos)
+    return order, travel(drawingOrder, (0, 0))[0], travel(order, (0, 0))[0]
+
+
+def fmt(v):
+    return f"{v:.4f}".rstrip("0").rstrip(".")
+
+
+# Writes G-code cutting the contours in order. The Y axis is flipped so the part looks the same as
+# in the SVG: X is measured from the left edge of the drawing as in the SVG, Y up from the lowest cut.
+def writeGCode(d, order, out, depth=6, safe=5, feed=1000, plunge=300):
+    height = max((contourBox(d, c)[3] for c in order), default=0)
+
+    def xy(p):
+        return f"X{fmt(p[0])} Y{fmt(height - p[1])}"
+
+    out.write("G21\nG90\n")
+    out.write(f"G0 Z{fmt(safe)}\n")
+    for c in order:
+        out.write(f"G0 {xy(c.start)}\n")
+        out.write(f"G1 Z{fmt(-depth)} F{fmt(plunge)}\n")
+        first = True
+        for i, rev in c.rows:
+            kind = d.kinds[i]
+            feedWord = f" F{fmt(feed)}" if first else ""
+            first = False
+            if kind == Drawer.LINE:
+                start, end = segmentEnds(d, i)
+                out.write(f"G1 {xy(start if rev else end)}{feedWord}\n")
+            elif kind == Drawer.CIRCLE:
+                out.write(f"G2 {xy(c.start)} I{fmt(-d.r[i])} J0{feedWord}\n")
+            else:
+                start, end = segmentEnds(d, i)
+                if rev:
+                    start, end = end, start
+                # Increasing SVG angles run clockwise once the Y axis is flipped
+                cmd = "G3" if rev else "G2"
+                i_ = d.x0[i] - start[0]
+                j_ = start[1] - d.y0[i]
+                if arcSweep(d, i) > math.pi + 1e-9 or arcSweep(d, i) < math.pi - 1e-9:
+                    out.write(f"{cmd} {xy(end)} I{fmt(i_)} J{fmt(j_)}{feedWord}\n")
+                else:
+                    # Split half circles, their center is ambiguous for some controllers
+                    a = d.x1[i] + arcSweep(d, i) / 2
+                    midPoint = (d.x0[i] + math.cos(a) * d.r[i], d.y0[i] + math.sin(a) * d.r[i])
+                    out.write(f"{cmd} {xy(midPoint)} I{fmt(i_)} J{fmt(j_)}{feedWord}\n")
+                    out.write(f"{cmd} {xy(end)} I{fmt(d.x0[i] - midPoint[0])} J{fmt(midPoint[1] - d.y0[i])}\n")
+        out.write(f"G0 Z{fmt(safe)}\n")
+    out.write("M2\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a jig or template and write its cuts as G-code.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('kind', choices=["jig", "template"], help="What to generate")
+    parser.add_argument('params', nargs="*", help="Generator options as name=value, e.g. shape=narrow")
+    parser.add_argument('--output', help="G-code file, stdout if not given")
+    parser.add_argument('--depth', type=str, default="6mm", help="Cut depth")
+    parser.add_argument('--safe', type=str, default="5mm", help="Safe height for rapid moves")
+    parser.add_argument('--feed', type=float, default=1000, help="Cutting feed, mm/min")
+    parser.add_argument('--plunge', type=float, default=300, help="Plunge feed, mm/min")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    d = generate(args.kind, parseParams(args.params))
+    order, before, after = toolpath(d, cutRows(d))
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    writeGCode(d, order, out, utils.unit(args.depth), utils.unit(args.safe), args.feed, args.plunge)
+    if args.output:
+        out.close()
+    saved = (1 - after / before) * 100 if before else 0
+    print(f"{len(order)} contours, rapid travel {before:.0f}mm in drawing order, {after:.0f}mm optimized "
+          f"({saved:.0f}% saved)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from template import generate_template
+from utils import Drawer, dbg, flag, unit, unitStr
+
+SH_NARROW = "narrow"
+SH_WIDE = "wide"
+SH_RECTANGLE = "rectangle"
+SH_LINE = "line"
+
+LAYER_SINGLE = "single"
+LAYER_DOUBLE = "double"
+LAYER_SUPPORT = "support"
+
+CX = 80
+CY = 80
+
+# Screw dimensions - from the center
+# Self measured
+SCREWS_DEWALT_TRIM = '-30.5mm,-30.5mm,6mm,10mm;-30.5mm,+30.5mm,6mm,10mm;+30.5mm,-30.5mm,6mm,10mm;+30.5mm,+30.5mm,6mm,10mm'
+# From https://www.routerforums.com/threads/dw625ek-base-plate.95657/page-2#lg=thread-95657&slide=0
+# Definitely wrong
+SCREWS_DEWALT_625 = '-57.5mm,-15mm,6mm;57.5mm,-15mm,6mm;0mm,75mm,6mm'
+
+# Rails for screws - common 1/4 and 1/3 rotation
+RAILS_DEFAULT = "0,90,180,270,120,240:25mm:47mm:6mm:10mm"
+
+SHAPES = [SH_NARROW, SH_RECTANGLE, SH_LINE, SH_WIDE]
+LAYERS = [LAYER_SINGLE, LAYER_DOUBLE, LAYER_SUPPORT]
+
+# Parameters as accepted by the command line, with their defaults
+DEFAULTS = {
+    'minRadius': "6in",
+    'bitDiam': "0.25in",
+    'pinDiam': "2mm",
+    'cutDiam': "1in",
+    'stepSize': "1in",
+    'steps': 6,
+    'subSteps': 4,
+    'stepAngle': 2,
+    'inches': False,
+    'shape': SH_RECTANGLE,
+    'screws': SCREWS_DEWALT_TRIM,
+    'screwRails': RAILS_DEFAULT,
+    'bigCircle': "2.5in",
+    'smallCircle': "1in",
+    'layers': LAYER_SINGLE,
+}
+
+# Converted parameters each phase of jigPhases() depends on, besides its position
+PHASE_INPUTS = {
+    'routerBase': ['bitDiam', 'cutDiam', 'screws', 'screwRails', 'layers'],
+    'generatePins': ['inches', 'minRadius', 'bitDiam', 'pinDiam', 'stepSize', 'steps', 'subSteps', 'stepAngle',
+                     'shape'],
+    'outline': ['minRadius', 'bitDiam', 'stepSize', 'steps', 'subSteps', 'shape', 'bigCircle', 'smallCircle'],
+    'glueGuides': ['bigCircle', 'pinDiam'],
+    'support': ['bigCircle', 'pinDiam'],
+}
+
+
+# Parses screw holes: x0,y0,d0[,D1];x1,y1,d1[,D1]
+def parseScrews(screws):
+    if not screws:
+        return []
+    result = []
+    for screw_hole in screws.split(";"):
+        attrs = screw_hole.split(",")
+        assert len(attrs) in [3, 4]
+        result.append([unit(a) for a in attrs])
+    return result
+
+
+# Parses screw rails: angle1[,angleN]:rad1:rad2:diam0[:diam1]
+def parseRails(screwRails):
+    if not screwRails:
+        return None
+    attrs = screwRails.split(':')
+    assert len(attrs) in [4, 5]
+    angs = [float(a) for a in attrs[0].split(',')]
+    return [angs] + [unit(a) for a in attrs[1:]]
+
+
+# Fills in defaults and converts all dimensions to mm
+def jigParams(params=None):
+    p = dict(DEFAULTS)
+    p.update(params or {})
+    unknown = set(p) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown jig parameters: {', '.join(sorted(unknown))}")
+    if p['shape'] not in SHAPES:
+        raise ValueError(f"Unknown shape: {p['shape']}")
+    if p['layers'] not in LAYERS:
+        raise ValueError(f"Unknown layers: {p['layers']}")
+    return {
+        'minRadius': unit(p['minRadius']),
+        'bitDiam': unit(p['bitDiam']),
+        'pinDiam': unit(p['pinDiam']),
+        'cutDiam': unit(p['cutDiam']),
+        'stepSize': unit(p['stepSize']),
+        'steps': int(p['steps']),
+        'subSteps': int(p['subSteps']),
+        'stepAngle': float(p['stepAngle']),
+        'inches': flag(p['inches']),
+        'shape': p['shape'],
+        'screws': parseScrews(p['screws']),
+        'screwRails': parseRails(p['screwRails']),
+        'bigCircle': unit(p['bigCircle']),
+        'smallCircle': unit(p['smallCircle']),
+        'layers': p['layers'],
+    }
+
+
+# Generates a jig, returns a Drawer. Params use the command line names and formats.
+# A utils.Profiler passed as profiler collects per-phase statistics.
+def generate_jig(params=None, argv=None, profiler=None):
+    return drawJig(jigParams(params), argv, profiler)
+
+
+# Generator of each kind of drawing, see generate()
+GENERATORS = {
+    'jig': generate_jig,
+    'template': generate_template,
+}
+
+
+# Generates a jig or a template set by kind, returns a Drawer
+def generate(kind, params=None, argv=None, profiler=None):
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown kind: {kind}")
+    return GENERATORS[kind](params, argv, profiler)
+
+
+# Generator options given on the command line as name=value
+def parseParams(args):
+    return dict(p.split("=", 1) for p in args)
+
+
+# Maps fn over jobs in a pool of worker processes, each set up by initializer(*initargs), and yields
+# the results in order. With workers == 1 everything runs in this process, all cores if workers is None.
+def poolMap(fn, jobs, *iterables, workers=None, initializer=None, initargs=()):
+    if workers == 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(fn, jobs, *iterables)
+        return
+    workers = workers or os.cpu_count()
+    chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        yield from pool.map(fn, jobs, *iterables, chunksize=chunksize)
+
+
+def compRadius(p, step, subStep):
+    return p['bitDiam'] / 2 + p['minRadius'] + step * p['stepSize'] + subStep * p['stepSize'] / p['subSteps']
+
+
+# Computes the whole steps x subSteps pin hole grid, relative to the router center.
+# Returns flat lists of x and y, indexed by step * subSteps + subStep.
+def pinGrid(p):
+    steps = p['steps']
+    subSteps = p['subSteps']
+    stepAngle = p['stepAngle']
+    shape = p['shape']
+    radii = [[compRadius(p, step, subStep) for subStep in range(0, subSteps)] for step in range(0, steps)]
+    xs = []
+    ys = []
+    if subSteps == 1 or shape == SH_LINE:
+        for row in radii:
+            xs.extend(row)
+            ys.extend([0] * subSteps)
+    elif shape == SH_RECTANGLE:
+        # Holes in a rectangle
+        substepWidth = 8
+        offsets = [(subSteps - 1) * substepWidth / 2 - subStep * substepWidth for subStep in range(0, subSteps)]
+        for row in radii:
+            for radius, y in zip(row, offsets):
+                xs.append(math.sqrt(radius * radius - y * y))
+                ys.append(y)
+    else:
+        angles = [math.radians(subStep * stepAngle - (subSteps - 1) * stepAngle / 2) for subStep in range(0, subSteps)]
+        coss = [math.cos(angrad) for angrad in angles]
+        sins = [math.sin(angrad) for angrad in angles]
+        if shape == SH_WIDE:
+            # Holes expanding from the bit
+            for row in radii:
+                for radius, c, s in zip(row, coss, sins):
+                    xs.append(c * radius)
+                    ys.append(- s * radius)
+        elif shape == SH_NARROW:
+            # Holes expanding from far away from the bit
+            # Math based on
+            # https://www.calculator.net/triangle-calculator.html?vc=&vx=20&vy=&va=&vz=60&vb=7&angleunits=d&x=0&y=0
+            far = p['minRadius'] + (steps - 1) * p['stepSize'] * 2
+            for row in radii:
+                for b, B, c, s in zip(row, angles, coss, sins):
+                    C = math.pi - math.asin(far * s / b)
+                    A = math.pi - B - C
+                    a = b * math.sin(A) / s
+                    xs.append(far - c * a)
+                    ys.append(- s * a)
+        else:
+            assert False, f"Unknown shape: {shape}"
+    return xs, ys
+
+
+# Phases of a jig in drawing order, as (name, layer, cx, cy, draw) where draw(d) adds the phase to a Drawer.
+# A phase only depends on its position and on the parameters listed in PHASE_INPUTS, see watch.py.
+def jigPhases(p):
+    minRadius = p['minRadius']
+    bitDiam = p['bitDiam']
+    pinDiam = p['pinDiam']
+    pinRadius = pinDiam / 2
+    cutRadius = p['cutDiam'] / 2
+    stepSize = p['stepSize']
+    steps = p['steps']
+    subSteps = p['subSteps']
+    shape = p['shape']
+    screws = p['screws']
+    screwRails = p['screwRails']
+    bigCircleRadius = p['bigCircle']
+    smallCircleRadius = p['smallCircle']
+    layers = p['layers']
+
+    # Pin hole positions relative to the router center, shared by both layers, computed on first use
+    grid = []
+
+    def generatePins(d, cx, cy, bottom=False):
+        if not grid:
+            grid.extend(pinGrid(p))
+        gridX, gridY = grid
+
+        def pinHolePosition(step, subStep):
+            idx = step * subSteps + subStep
+            return cx + gridX[idx], cy + gridY[idx]
+
+        # Holes for the pins
+        for step in range(0, steps):
+            for subStep in range(0, subSteps):
+                x, y = pinHolePosition(step, subStep)
+                d.circle(x, y, pinRadius, d.CUT)
+
+        if not bottom:
+            # Per-substep/angle guides
+            if shape != SH_LINE:
+                for subStep in range(0, subSteps):
+                    x0, y0 = pinHolePosition(0, subStep)
+                    x1, y1 = pinHolePosition(steps - 1, subStep)
+                    d.line(x0, y0, x1, y1, d.GUIDE, extra='stroke-dasharray="3,3"')
+
+            # Per-step/major guides
+            if shape != SH_LINE:
+                for step in range(0, steps):
+                    for subStep in range(1, subSteps):
+                        x0, y0 = pinHolePosition(step, subStep - 1)
+                        x1, y1 = pinHolePosition(step, subStep)
+                        d.line(x0, y0, x1, y1, d.GUIDE, extra='stroke-dasharray="2,2"')
+
+            # Per-step labels
+            for step in range(0, steps):
+                s = unitStr(minRadius + step * stepSize)
+                x, y = pinHolePosition(step, 0)
+                d.text(x + 2, y + 5, s, anchor="end", fs=6, color=d.MARK, rotate=270)
+                d.line(x, y + 1, x, y + 4, d.MARK)
+                if shape != SH_LINE:
+                    s = unitStr(minRadius + step * stepSize + (subSteps - 1) * stepSize / subSteps)
+                    x, y = pinHolePosition(step, subSteps - 1)
+                    d.text(x + 2, y - 5, s, anchor="start", fs=4, color=d.MARK, rotate=270)
+                    d.line(x, y - 1, x, y - 4, d.MARK)
+
+            if shape != SH_LINE:
+                # Per-angle labels
+                if subSteps > 0:
+                    for subStep in range(1, subSteps):
+                        s = "+" + unitStr(subStep * stepSize / subSteps)
+                        x, y = pinHolePosition(0, subStep)
+                        d.text(x - 2, y + 1, s, anchor="end", fs=4, color=d.MARK)
+                        x, y = pinHolePosition(steps - 1, subStep)
+                        d.text(x + 2, y + 1, s, anchor="start", fs=4, color=d.MARK)
+            else:
+                # Minor tick labels
+                for step in range(0, steps):
+                    for subStep in range(1, subSteps):
+                        x, y = pinHolePosition(step, subStep)
+                        s = "+" + unitStr(subStep * stepSize / subSteps)
+                        d.text(x + 1, y - 2, s, anchor="start", fs=3, color=d.MARK, rotate=270)
+
+    def outline(d, cx, cy):
+        # draw shape around
+        bcr = bigCircleRadius
+        scr = smallCircleRadius
+        scd = compRadius(p, steps, 0)    # small circle distance
+
+        if shape in [SH_NARROW, SH_LINE]:
+            # Angle for the line adjacent to two circles
+            rd = bcr - scr  # radius difference triangle
+            ang = math.acos(rd / scd)
+            dbg(ang)
+
+            # Left arc and connection points
+            bx = math.cos(ang) * bcr
+            by = math.sin(ang) * bcr
+            d.circle(cx + bx, cy + by, 1, color=d.DBG)
+            d.circle(cx + bx, cy - by, 1, color=d.DBG)
+            d.arc(cx, cy, bcr, ang, 0, color=d.CUT)
+
+            # Right arc and connection points
+            sx = math.cos(ang) * scr
+            sy = math.sin(ang) * scr
+            d.circle(cx + scd + sx, cy + sy, 1, color=d.DBG)
+            d.circle(cx + scd + sx, cy - sy, 1, color=d.DBG)
+            d.arc(cx + scd, cy, scr, ang, 0, color=d.CUT, reverse=1)
+
+            # Connecting lines
+            d.line(cx + bx, cy + by, cx + scd + sx, cy + sy, color=d.CUT)
+            d.line(cx + bx, cy - by, cx + scd + sx, cy - sy, color=d.CUT)
+
+        else:
+            # "Rectangle"
+            rounding = 2
+            d.arc(cx, cy, bcr, math.pi / 2, 0, color=d.CUT)
+            x0 = cx
+            y0 = cx - bcr
+            x1 = cx + scd + scr
+            y1 = cy + bcr
+            d.line(x0, y0, x1 - rounding, y0, color=d.CUT)
+            d.line(x0, y1, x1 - rounding, y1, color=d.CUT)
+            d.line(x1, y0 + rounding, x1, y1 - rounding, color=d.CUT)
+            d.arc(x1 - rounding, y0 + rounding, rounding, 45, 45, color=d.CUT, reverse=True, degrees=True)
+            d.arc(x1 - rounding, y1 - rounding, rounding, 45, -45, color=d.CUT, reverse=True, degrees=True)
+
+    def support(d, cx, cy):
+        # draw shape around the router base
+        d.circle(cx, cy, bigCircleRadius, color=d.CUT)
+        # draw a supporting piece
+        supportRadius = unit("30mm")
+        x2 = cx + bigCircleRadius + 10 + supportRadius
+        y2 = cy - bigCircleRadius + supportRadius
+        d.circle(x2, y2, pinRadius, color=d.CUT)
+        d.cross(x2, y2, supportRadius, color=d.GUIDE)
+        d.circle(x2, y2, supportRadius, color=d.CUT)
+
+    def routerBase(d, cx, cy, bottom):
+        # Hole for the bit
+        d.circle(cx, cy, bitDiam / 2, d.CUT)
+
+        # Hole for the cut
+        d.circle(cx, cy, cutRadius, d.CUT)
+
+        # Screw holes
+
+        if screws:
+            for attrs in screws:
+                sx = cx + attrs[0]
+                sy = cy + attrs[1]
+                sr = attrs[2] / 2
+                d.cross(sx, sy, 1, d.MARK)
+                if not bottom or len(attrs) == 3:
+                    # smaller hole
+                    d.circle(sx, sy, sr, d.CUT)
+                    if layers == LAYER_SINGLE and len(attrs) == 4:
+                        sr = attrs[3] / 2
+                        d.circle(sx, sy, sr, d.MARK)
+                elif bottom:
+                    if len(attrs) == 4:
+                        sr = attrs[3] / 2
+                    d.circle(sx, sy, sr, d.CUT)
+
+        # Screw rails
+        if screwRails:
+            attrs = screwRails
+            angs = attrs[0]
+            rad1 = attrs[1]
+            rad2 = attrs[2]
+            dbg(rad1)
+            diam0 = attrs[3]
+            diam1 = attrs[4] if len(attrs) == 5 else diam0
+
+            def genRail(angle, rad1, rad2, diam, color):
+                x0 = cx + math.cos(angle) * rad1
+                y0 = cy + math.sin(angle) * rad1
+                x1 = cx + math.cos(angle) * rad2
+                y1 = cy + math.sin(angle) * rad2
+                d.arc(x0, y0, diam / 2, math.pi / 2, angle, color=color)
+                d.arc(x1, y1, diam / 2, math.pi / 2, math.pi + angle, color=color)
+                lx0 = x0 + math.cos(angle + math.pi / 2) * diam / 2
+                ly0 = y0 + math.sin(angle + math.pi / 2) * diam / 2
+                lx1 = x1 + math.cos(angle + math.pi / 2) * diam / 2
+                ly1 = y1 + math.sin(angle + math.pi / 2) * diam / 2
+                d.line(lx0, ly0, lx1, ly1, color=color)
+                rx0 = x0 + math.cos(angle - math.pi / 2) * diam / 2
+                ry0 = y0 + math.sin(angle - math.pi / 2) * diam / 2
+                rx1 = x1 + math.cos(angle - math.pi / 2) * diam / 2
+                ry1 = y1 + math.sin(angle - math.pi / 2) * diam / 2
+                d.line(rx0, ry0, rx1, ry1, color=color)
+
+            for angDegs in angs:
+                ang = math.radians(angDegs)
+                if not bottom or len(attrs) == 4:
+                    # smaller rail
+                    genRail(ang, rad1, rad2, diam0, color=d.CUT)
+                    if layers == LAYER_SINGLE and len(attrs) == 5:
+                        # larger rail - mark
+                        genRail(ang, rad1, rad2, diam1, color=d.MARK)
+                elif bottom:
+                    genRail(ang, rad1, rad2, diam1, color=d.CUT)
+
+    def glueGuides(d, cx, cy):
+        radius = bigCircleRadius - 5 * pinRadius
+        for ang in [60, 210, 285]:
+            x = cx + math.cos(math.radians(ang)) * radius
+            y = cy + math.sin(math.radians(ang)) * radius
+            d.circle(x, y, pinRadius, color=d.CUT)
+
+    # First layer
+    phases = [
+        ("routerBase", 0, CX, CY, lambda d: routerBase(d, CX, CY, bottom=False)),
+        ("generatePins", 0, CX, CY, lambda d: generatePins(d, CX, CY, bottom=False)),
+        ("outline", 0, CX, CY, lambda d: outline(d, CX, CY)),
+    ]
+    # Second layer, if needed
+    CY2 = CY + 2 * bigCircleRadius + 20
+    if layers in [LAYER_DOUBLE, LAYER_SUPPORT]:
+        phases.append(("routerBase", 1, CX, CY2, lambda d: routerBase(d, CX, CY2, bottom=True)))
+        phases.append(("glueGuides", 0, CX, CY, lambda d: glueGuides(d, CX, CY)))
+        phases.append(("glueGuides", 1, CX, CY2, lambda d: glueGuides(d, CX, CY2)))
+        if layers == LAYER_DOUBLE:
+            phases.append(("generatePins", 1, CX, CY2, lambda d: generatePins(d, CX, CY2, bottom=True)))
+            phases.append(("outline", 1, CX, CY2, lambda d: outline(d, CX, CY2)))
+        else:
+            phases.append(("support", 1, CX, CY2, lambda d: support(d, CX, CY2)))
+    return phases
+
+
+# Draws a jig from already converted parameters, see jigParams()
+def drawJig(p, argv=None, profiler=None):
+    phases = jigPhases(p)
+    d = Drawer(profiler=profiler)
+
+    # Print command line
+    with d.phase("commandLine"):
+        for idx, arg in enumerate(argv or []):
+            d.text(3, 3 + idx * 3, arg, fs=3, anchor="start", color=d.MARK)
+
+    for name, layer, _, _, draw in phases:
+        with d.phase(name, layer):
+            draw(d)
+    return d
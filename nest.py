@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import argparse
+import bisect
+import json
+import os
+
+import utils
+from batch import jobParams, readManifest
+from utils import Drawer, GridIndex, unit
+
+# Grid cell size of the overlap index, roughly the size of a small part
+INDEX_CELL = 100
+
+
+# A piece to cut: some rows of a generated Drawer and the extent of their geometry
+class Part:
+
+    def __init__(self, name, drawer, rows):
+        self.name = name
+        self.drawer = drawer
+        self.rows = rows
+        self.box = drawer.extent(rows, Drawer.CUT) or drawer.extent(rows)
+        self.width = self.box[2] - self.box[0]
+        self.height = self.box[3] - self.box[1]
+
+    def area(self):
+        return self.width * self.height
+
+
+# Splits a generated Drawer into parts, one per layer
+def partsOf(name, d):
+    layers = d.layerRows()
+    parts = []
+    for layer, rows in sorted(layers.items()):
+        if d.extent(rows) is None:
+            continue
+        parts.append(Part(name if len(layers) == 1 else f"{name}-{layer}", d, rows))
+    return parts
+
+
+# One stock panel, filled bottom-left first from a sorted list of candidate corners
+class Sheet:
+
+    def __init__(self, width, height, edge, gap):
+        self.width = width
+        self.height = height
+        self.edge = edge
+        self.gap = gap
+        self.index = GridIndex(INDEX_CELL)
+        self.candidates = [(edge, edge)]
+        self.placements = []
+        self.usedArea = 0
+        # Sizes known not to fit anymore, anything at least as large is skipped
+        self.failed = []
+
+    def fits(self, x, y, w, h):
+        if x + w > self.width - self.edge or y + h > self.height - self.edge:
+            return False
+        # Boxes exactly gap apart are fine
+        return not self.index.query(x, y, x + w, y + h, self.gap - 1e-9)
+
+    # Whether x, y lies inside a placed part. Corners on the edge of a part, as left by a zero gap, stay usable.
+    def covered(self, x, y):
+        boxes = self.index.boxes
+        return any(boxes[k][0] < x < boxes[k][2] and boxes[k][1] < y < boxes[k][3] for k in self.index.query(x, y, x, y))
+
+    def tryPlace(self, part, allowRotate):
+        options = [(part.width, part.height, False)]
+        if allowRotate and part.width != part.height:
+            options.append((part.height, part.width, True))
+        options = [o for o in options if not any(o[0] >= fw and o[1] >= fh for fw, fh in self.failed)]
+        if not options or part.area() > self.width * self.height - self.usedArea:
+            return False
+        idx = 0
+        while idx < len(self.candidates):
+            y, x = self.candidates[idx]
+            if self.covered(x, y):
+                # Corner got covered by a later placement
+                del self.candidates[idx]
+                continue
+            for w, h, rotated in options:
+                if self.fits(x, y, w, h):
+                    del self.candidates[idx]
+                    self.add(part, x, y, w, h, rotated)
+                    return True
+            idx += 1
+        self.failed.extend((w, h) for w, h, _ in options)
+        return False
+
+    def add(self, part, x, y, w, h, rotated):
+        self.index.insert(len(self.placements), x, y, x + w, y + h)
+        self.placements.append((part, x, y, rotated))
+        self.usedArea += w * h
+        bisect.insort(self.candidates, (y, x + w + self.gap))
+        bisect.insort(self.candidates, (y + h + self.gap, x))
+
+    def utilization(self):
+        return self.usedArea / (self.width * self.height)
+
+    def draw(self):
+        d = Drawer(margin=0)
+        with d.phase("sheet"):
+            d.line(0, 0, self.width, 0, d.DBG)
+            d.line(self.width, 0, self.width, self.height, d.DBG)
+            d.line(self.width, self.height, 0, self.height, d.DBG)
+            d.line(0, self.height, 0, 0, d.DBG)
+        for part, x, y, rotated in self.placements:
+            minx, miny, maxx, maxy = part.box
+            if rotated:
+                # Rotating maps the box corner (minx, maxy) onto (-maxy, minx)
+                d.place(part.drawer, part.rows, x + maxy, y - minx, rotate=True)
+            else:
+                d.place(part.drawer, part.rows, x - minx, y - miny)
+        return d
+
+
+# Packs parts onto as many sheets as needed, largest parts first
+def nest(parts, width, height, edge=10, gap=5, allowRotate=True):
+    sheets = []
+    for part in sorted(parts, key=lambda p: -p.area()):
+        fitsEmpty = (part.width <= width - 2 * edge and part.height <= height - 2 * edge) or \
+            (allowRotate and part.height <= width - 2 * edge and part.width <= height - 2 * edge)
+        if not fitsEmpty:
+            raise ValueError(f"Part {part.name} ({part.width:.1f}x{part.height:.1f}) does not fit on a sheet")
+        for sheet in sheets:
+            if sheet.tryPlace(part, allowRotate):
+                break
+        else:
+            sheet = Sheet(width, height, edge, gap)
+            sheets.append(sheet)
+            sheet.tryPlace(part, allowRotate)
+    return sheets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nest many jigs and templates onto stock sheets.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('manifest', help="JSONL or CSV file with one parameter set per line, see batch.py")
+    parser.add_argument('--outDir', default="sheets", help="Directory for the sheet SVGs")
+    parser.add_argument('--sheetWidth', type=str, default="1220mm", help="Sheet width")
+    parser.add_argument('--sheetHeight', type=str, default="2440mm", help="Sheet height")
+    parser.add_argument('--edge', type=str, default="10mm", help="Clearance to the sheet edges")
+    parser.add_argument('--gap', type=str, default="5mm", help="Clearance between parts")
+    parser.add_argument('--noRotate', action="store_true", help="Do not rotate parts by 90 degrees")
+    parser.add_argument('--report', help="Write the utilization report to this JSON file")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    parts = []
+    for job in readManifest(args.manifest):
+        generate, params = jobParams(job)
+        parts.extend(partsOf(job['name'], generate(params)))
+
+    width = unit(args.sheetWidth)
+    height = unit(args.sheetHeight)
+    sheets = nest(parts, width, height, unit(args.edge), unit(args.gap), not args.noRotate)
+
+    os.makedirs(args.outDir, exist_ok=True)
+    report = []
+    for idx, sheet in enumerate(sheets):
+        output = os.path.join(args.outDir, f"sheet-{idx:03d}.svg")
+        with open(output, "w") as f:
+            sheet.draw().writeSVG(f)
+            f.write("\n")
+        report.append({'sheet': output, 'parts': [p.name for p, _, _, _ in sheet.placements],
+                       'utilization': sheet.utilization()})
+        print(f"{output}: {len(sheet.placements)} parts, {sheet.utilization() * 100:.1f}% used")
+    total = sum(s.usedArea for s in sheets) / (len(sheets) * width * height) if sheets else 0
+    print(f"{len(parts)} parts on {len(sheets)} sheets, {total * 100:.1f}% used")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({'utilization': total, 'sheets': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import utils
+from check import FLATTEN_TOLERANCE, checkClearance, features
+from jig import DEFAULTS, LAYER_DOUBLE, PHASE_INPUTS, SH_LINE, SH_NARROW, SH_WIDE, SHAPES, compRadius, drawJig, jigParams, parseParams, pinGrid
+from nest import partsOf
+from utils import Drawer, flag, num, unit
+
+# Step angles tried for the shapes that use them, in degrees
+STEP_ANGLES = [0.5, 1, 1.5, 2, 3, 4, 5]
+# How far above the smallest possible circle radius the search goes, in mm
+CIRCLE_RANGE = 40
+
+
+def initWorker():
+    utils.debug = False
+
+
+def mm(v):
+    return num(v, 6) + "mm"
+
+
+# Smallest big circle around the router base features, from the converted fixed parameters
+def routerBaseRadius(base, spacing):
+    radius = max(base['cutDiam'], base['bitDiam']) / 2
+    for attrs in base['screws']:
+        radius = max(radius, math.hypot(attrs[0], attrs[1]) + max(attrs[2:]) / 2)
+    if base['screwRails']:
+        rad2 = max(base['screwRails'][1:3])
+        radius = max(radius, rad2 + max(base['screwRails'][3:]) / 2)
+    # Arcs are checked as chords, which may come closer by the flattening tolerance
+    return radius + spacing + FLATTEN_TOLERANCE
+
+
+# Cheap checks of the pin grid alone, shared by all circle sizes: neighbouring holes must keep the spacing.
+# Returns the convex hull of the hole centers relative to the router center, or None if holes are too close.
+def pinHull(p, spacing):
+    xs, ys = pinGrid(p)
+    steps, subSteps = p['steps'], p['subSteps']
+    need = p['pinDiam'] + spacing
+    for idx in range(len(xs)):
+        step, subStep = divmod(idx, subSteps)
+        for other in (idx + 1 if subStep + 1 < subSteps else None, idx + subSteps if step + 1 < steps else None):
+            if other is not None and math.dist((xs[idx], ys[idx]), (xs[other], ys[other])) < need:
+                return None
+    return convexHull(list(zip(xs, ys)))
+
+
+# Andrew's monotone chain, returns the hull vertices
+def convexHull(points):
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def half(pts):
+        chain = []
+        for q in pts:
+            while len(chain) >= 2 and ((chain[-1][0] - chain[-2][0]) * (q[1] - chain[-2][1]) -
+                                       (chain[-1][1] - chain[-2][1]) * (q[0] - chain[-2][0])) <= 0:
+                chain.pop()
+            chain.append(q)
+        return chain[:-1]
+
+    return half(points) + half(points[::-1])
+
+
+# Signed distance from q (relative to the router center) to the outline drawn by jig.outline(): the hull of
+# the big and the small circle for narrow and line shapes, a half circle and a rectangle for the others.
+def outlineDistance(shape, q, bcr, scr, scd):
+    x, y = q[0], abs(q[1])
+    if shape in [SH_NARROW, SH_LINE]:
+        b = (bcr - scr) / scd
+        a = math.sqrt(1 - b * b)
+        # Position along the axis, between the tangent points of the two circles
+        k = a * x - b * y
+        if k < 0:
+            return math.hypot(x, y) - bcr
+        if k > a * scd:
+            return math.hypot(x - scd, y) - scr
+        return b * x + a * y - bcr
+    if x < 0:
+        return math.hypot(x, y) - bcr
+    return max(y - bcr, x - scd - scr)
+
+
+# All candidate parameter sets covering minRadius..maxRadius in increments of resolution, as
+# (lower bound of the footprint, pin grid, CLI parameters), smallest bound first.
+# Candidates failing the cheap pin grid and outline checks are only counted.
+def candidates(fixed, minRadius, maxRadius, resolution, spacing, shapes=SHAPES, maxSubSteps=8, circleStep=1):
+    base = jigParams(fixed)
+    bigMin = routerBaseRadius(base, spacing)
+    smallMin = base['pinDiam'] / 2 + spacing
+    margin = base['pinDiam'] / 2 + spacing
+    layerCount = 2 if base['layers'] == LAYER_DOUBLE else 1
+    nCircles = int(CIRCLE_RANGE / circleStep) + 1
+    result = []
+    pruned = 0
+    for shape in shapes:
+        for subSteps in range(1, maxSubSteps + 1):
+            stepSize = resolution * subSteps
+            steps = max(1, math.ceil((maxRadius - minRadius - (subSteps - 1) * resolution) / stepSize - 1e-9) + 1)
+            for stepAngle in STEP_ANGLES if shape in [SH_NARROW, SH_WIDE] and subSteps > 1 else [base['stepAngle']]:
+                params = dict(fixed, shape=shape, minRadius=mm(minRadius), stepSize=mm(stepSize), steps=steps,
+                              subSteps=subSteps, stepAngle=stepAngle)
+                p = dict(base, shape=shape, minRadius=minRadius, stepSize=stepSize, steps=steps, subSteps=subSteps,
+                         stepAngle=stepAngle)
+                try:
+                    hull = pinHull(p, spacing)
+                except (ValueError, ZeroDivisionError):
+                    hull = None
+                if hull is None:
+                    pruned += nCircles * nCircles
+                    continue
+                scd = compRadius(p, steps, 0)
+                bigStart = max(bigMin, max(abs(q[1]) for q in hull) + margin)
+                for b in range(nCircles):
+                    bcr = bigStart + b * circleStep
+                    for s in range(nCircles):
+                        scr = smallMin + s * circleStep
+                        # The small circle must fit the big one, all holes must be inside the outline
+                        if scr > bcr or bcr - scr >= scd or \
+                                any(outlineDistance(shape, q, bcr, scr, scd) > -margin for q in hull):
+                            pruned += 1
+                            continue
+                        # Extent of the outline, as in Drawer.extent()
+                        bound = (bcr + max(scd + scr, bcr)) * 2 * bcr * layerCount
+                        result.append((bound, (shape, subSteps, stepAngle),
+                                       dict(params, bigCircle=mm(bcr), smallCircle=mm(scr))))
+    result.sort(key=lambda c: c[0])
+    return result, pruned
+
+
+# Whether point q is inside the closed outline given as segments (even-odd rule)
+def inside(q, segments):
+    crossings = 0
+    for x0, y0, x1, y1 in segments:
+        if (y0 > q[1]) != (y1 > q[1]) and q[0] < x0 + (q[1] - y0) * (x1 - x0) / (y1 - y0):
+            crossings += 1
+    return crossings % 2 == 1
+
+
+# Number of first layer CUT features not inside the first layer outline
+def outsideOutline(d):
+    cut = d.colorIndex.get(Drawer.CUT)
+    outline = []
+    points = []
+    for i in range(len(d)):
+        name, layer = d.phaseTable[d.phaseIds[i]]
+        if layer != 0 or d.colors[i] != cut or d.kinds[i] == Drawer.TEXT:
+            continue
+        if name == "outline":
+            outline.append(i)
+        else:
+            points.append((d.x0[i], d.y0[i]))
+    segments = [g for _, _, g in features(d, outline)]
+    return sum(1 for q in points if not inside(q, segments))
+
+
+# Whether the geometry of a phase is independent of the circle sizes being searched
+def circleFree(phase):
+    return not {'bigCircle', 'smallCircle'} & set(PHASE_INPUTS.get(phase, ['bigCircle']))
+
+
+# Generates and checks a candidate in a worker process. Returns (footprint, None, None) if it is valid,
+# else (None, reason, scope) where scope tells whether the failure rules out more than this candidate:
+# "fixed" for the fixed router base features alone, "grid" for every circle size with this pin grid.
+def evaluate(params, spacing):
+    try:
+        d = drawJig(jigParams(params))
+    except (ValueError, ZeroDivisionError, AssertionError) as e:
+        return None, f"{type(e).__name__}: {e}", None
+    violations = checkClearance(d, spacing)
+    if violations:
+        scope = None
+        for v in violations:
+            phases = {v['a']['phase'], v['b']['phase']}
+            if phases == {'routerBase'}:
+                a, b = v['a'], v['b']
+                return None, (f"{a['kind']} and {b['kind']} of routerBase/{a['layer']} are {v['distance']:.3f}mm "
+                              f"apart at ({v['x']:.2f}, {v['y']:.2f})"), "fixed"
+            if all(circleFree(phase) for phase in phases):
+                scope = "grid"
+        return None, f"{len(violations)} clearance violations", scope
+    outside = outsideOutline(d)
+    if outside:
+        return None, f"{outside} features outside the outline", None
+    return sum(part.area() for part in partsOf("", d)), None, None
+
+
+# Evaluates candidates cheapest bound first across a process pool. Once a valid jig is found, candidates
+# whose bound is not below its footprint are skipped, as are all candidates of a pin grid that failed on
+# its own. Stops after timeLimit seconds with the best so far.
+def optimize(cands, spacing, workers=None, timeLimit=None):
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    best = None
+    stats = {'evaluated': 0, 'invalid': 0, 'prunedByGrid': 0, 'prunedByBound': 0, 'timedOut': False,
+             'infeasible': None}
+    badGrids = set()
+    pending = {}
+    remaining = len(cands)
+    it = iter(cands)
+    exhausted = False
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker) as pool:
+        while True:
+            while not exhausted and len(pending) < workers * 2:
+                cand = next(it, None)
+                if cand is None or (best is not None and cand[0] >= best[0]):
+                    # Sorted by bound, nothing left can beat the best
+                    exhausted = True
+                    break
+                remaining -= 1
+                if cand[1] in badGrids:
+                    stats['prunedByGrid'] += 1
+                    continue
+                pending[pool.submit(evaluate, cand[2], spacing)] = cand
+            if not pending:
+                break
+            timeout = None if timeLimit is None else max(0, timeLimit - (time.perf_counter() - start))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                stats['timedOut'] = True
+                break
+            for future in done:
+                if future.cancelled():
+                    continue
+                bound, grid, params = pending.pop(future)
+                footprint, reason, scope = future.result()
+                stats['evaluated'] += 1
+                if footprint is None:
+                    stats['invalid'] += 1
+                    if scope == "fixed":
+                        stats['infeasible'] = reason
+                    elif scope == "grid":
+                        badGrids.add(grid)
+                elif best is None or footprint < best[0]:
+                    best = (footprint, params)
+            if stats['infeasible']:
+                break
+            # Drop queued candidates that can no longer win
+            for future, (bound, grid, _) in list(pending.items()):
+                if (grid in badGrids or (best is not None and bound >= best[0])) and future.cancel():
+                    del pending[future]
+                    remaining += 1
+        for future in pending:
+            future.cancel()
+    # Candidates never reached are only ruled out by their bound if the search ran to the end
+    stats['unexplored' if stats['timedOut'] or stats['infeasible'] else 'prunedByBound'] = remaining
+    stats['seconds'] = time.perf_counter() - start
+    return best, stats
+
+
+# Command line options of circle-jig-gen.py for a parameter set, boolean ones as bare flags
+def commandArgs(params):
+    args = []
+    for k, v in params.items():
+        if isinstance(DEFAULTS.get(k), bool):
+            if flag(v):
+                args.append(f"--{k}")
+        else:
+            args.append(f"--{k} {shlex.quote(str(v))}")
+    return args
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search for the jig with the smallest footprint covering a radius range.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('params', nargs="*", help="Fixed jig options as name=value, e.g. pinDiam=3mm layers=double")
+    parser.add_argument('--minRadius', type=str, default="6in", help="Smallest radius to cut")
+    parser.add_argument('--maxRadius', type=str, default="12in", help="Largest radius to cut")
+    parser.add_argument('--resolution', type=str, default="0.25in", help="Radius increment between pin holes")
+    parser.add_argument('--spacing', type=str, default="1mm", help="Smallest clearance between any two cuts")
+    parser.add_argument('--shapes', type=str, default=",".join(SHAPES), help="Shapes to try")
+    parser.add_argument('--maxSubSteps', type=int, default=8, help="Most pin holes per step to try")
+    parser.add_argument('--circleStep', type=str, default="1mm", help="Increment of the circle radii tried")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, all cores if not given")
+    parser.add_argument('--timeLimit', type=float, default=None, help="Stop after this many seconds with the best so far")
+    parser.add_argument('--output', help="Write the SVG of the best jig to this file")
+    parser.add_argument('--report', help="Write the best parameters and search statistics to this JSON file")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    fixed = parseParams(args.params)
+    cands, pruned = candidates(fixed, unit(args.minRadius), unit(args.maxRadius), unit(args.resolution),
+                               unit(args.spacing), args.shapes.split(","), args.maxSubSteps, unit(args.circleStep))
+    best, stats = optimize(cands, unit(args.spacing), args.workers, args.timeLimit)
+    stats.update(candidates=len(cands) + pruned, prunedByGeometry=pruned)
+
+    print(f"{stats['candidates']} candidates, {pruned} pruned by pin and outline geometry, "
+          f"{stats['prunedByGrid']} by failed pin grids, {stats.get('prunedByBound', 0)} by footprint, "
+          f"{stats['evaluated']} generated ({stats['invalid']} invalid) in {stats['seconds']:.1f}s" +
+          (", time limit hit" if stats['timedOut'] else ""), file=sys.stderr)
+    if stats['infeasible']:
+        print(f"No jig can keep the spacing: {stats['infeasible']}", file=sys.stderr)
+        sys.exit(1)
+    if best is None:
+        print("No valid jig found", file=sys.stderr)
+        sys.exit(1)
+    footprint, params = best
+    print(f"Footprint {footprint / 100:.1f}cm2:", file=sys.stderr)
+    print("./circle-jig-gen.py " + " ".join(commandArgs(params)))
+    if args.output:
+        with open(args.output, "w") as f:
+            drawJig(jigParams(params)).writeSVG(f)
+            f.write("\n")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({'footprint': footprint, 'params': params, 'stats': stats}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
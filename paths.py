@@ -0,0 +1,127 @@
+import math
+
+from utils import Drawer, arcSweep
+
+# Default distance under which end points are considered the same, in mm
+TOLERANCE = 0.01
+
+
+# A continuous run of primitives that can be cut without lifting the tool.
+# rows holds (row, reverse) pairs, in cutting order.
+class Contour:
+
+    def __init__(self, rows, start, end, closed):
+        self.rows = rows
+        self.start = start
+        self.end = end
+        self.closed = closed
+
+    def reversed(self):
+        return Contour([(i, not rev) for i, rev in reversed(self.rows)], self.end, self.start, self.closed)
+
+
+# End points of a line or arc row, in drawing direction
+def segmentEnds(d, i):
+    if d.kinds[i] == Drawer.LINE:
+        return (d.x0[i], d.y0[i]), (d.x1[i], d.y1[i])
+    x0, y0, x1, y1 = d.arcEnds(i)
+    return (x0, y0), (x1, y1)
+
+
+# Length of a line, arc or circle row
+def rowLength(d, i):
+    kind = d.kinds[i]
+    if kind == Drawer.LINE:
+        return math.hypot(d.x1[i] - d.x0[i], d.y1[i] - d.y0[i])
+    if kind == Drawer.CIRCLE:
+        return 2 * math.pi * d.r[i]
+    if kind == Drawer.ARC:
+        return d.r[i] * arcSweep(d, i)
+    return 0
+
+
+# Rows of the given color that are cut, i.e. everything but text
+def cutRows(d, color=Drawer.CUT):
+    colorIdx = d.colorIndex.get(color)
+    if colorIdx is None:
+        return []
+    return [i for i in range(len(d)) if d.colors[i] == colorIdx and d.kinds[i] != Drawer.TEXT]
+
+
+# Joins lines and arcs with coinciding end points into contours. Circles are contours of their own.
+def contours(d, rows, tol=TOLERANCE):
+    result = []
+    ends = {}
+    segments = {}
+
+    def cell(p):
+        return round(p[0] / tol), round(p[1] / tol)
+
+    for i in rows:
+        if d.kinds[i] == Drawer.CIRCLE:
+            start = (d.x0[i] + d.r[i], d.y0[i])
+            result.append(Contour([(i, False)], start, start, True))
+        else:
+            p0, p1 = segmentEnds(d, i)
+            segments[i] = (p0, p1)
+            ends.setdefault(cell(p0), []).append(i)
+            ends.setdefault(cell(p1), []).append(i)
+
+    # Finds an unused segment touching p, returns it with its direction away from p
+    def take(p):
+        cx, cy = cell(p)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i in ends.get((cx + dx, cy + dy), ()):
+                    if i not in segments:
+                        continue
+                    p0, p1 = segments[i]
+                    if math.dist(p, p0) <= tol:
+                        del segments[i]
+                        return i, False, p1
+                    if math.dist(p, p1) <= tol:
+                        del segments[i]
+                        return i, True, p0
+        return None
+
+    for i in rows:
+        if i not in segments:
+            continue
+        start, end = segments.pop(i)
+        chain = [(i, False)]
+        while not math.dist(start, end) <= tol:
+            found = take(end)
+            if found is None:
+                break
+            j, rev, end = found
+            chain.append((j, rev))
+        if not math.dist(start, end) <= tol:
+            while True:
+                found = take(start)
+                if found is None:
+                    break
+                j, rev, start = found
+                # Walking backwards, so the segment is cut in the opposite direction
+                chain.insert(0, (j, not rev))
+        result.append(Contour(chain, start, end, math.dist(start, end) <= tol))
+    return result
+
+
+# Bounding box of a contour
+def contourBox(d, c):
+    return d.extent([i for i, _ in c.rows])
+
+
+# Emits chains of touching CUT lines and arcs with the same style as single SVG paths.
+# The rows themselves are kept for other outputs. Returns the element counts before and after.
+def mergePaths(d, color=Drawer.CUT, tol=TOLERANCE):
+    before = d.elementCount()
+    groups = {}
+    for i in cutRows(d, color):
+        if d.kinds[i] != Drawer.CIRCLE and i not in d.pathRows:
+            groups.setdefault(d.styles[i], []).append(i)
+    for rows in groups.values():
+        for c in contours(d, rows, tol):
+            if len(c.rows) > 1:
+                d.addPath(c.rows, c.closed)
+    return before, d.elementCount()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import struct
+import sys
+import zlib
+
+import utils
+from jig import generate, parseParams
+from utils import Drawer, arcSweep
+
+# Default size of the longer side of a thumbnail, in pixels
+SIZE = 256
+
+NAMED_COLORS = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "red": (255, 0, 0),
+    "green": (0, 128, 0),
+    "blue": (0, 0, 255),
+    "orange": (255, 165, 0),
+}
+
+
+def rgb(color):
+    if color.startswith("#"):
+        h = color[1:]
+        if len(h) == 3:
+            h = "".join(c * 2 for c in h)
+        return tuple(bytes.fromhex(h[:6]))
+    return NAMED_COLORS.get(color, (0, 0, 0))
+
+
+# An RGB image drawn with one pixel wide strokes
+class Raster:
+
+    def __init__(self, width, height, background=(255, 255, 255)):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def plot(self, x, y, color):
+        ix = int(x)
+        iy = int(y)
+        if 0 <= ix < self.width and 0 <= iy < self.height:
+            idx = (iy * self.width + ix) * 3
+            self.pixels[idx:idx + 3] = color
+
+    def line(self, x0, y0, x1, y1, color):
+        n = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+        dx = (x1 - x0) / n
+        dy = (y1 - y0) / n
+        self.points([(x0 + dx * k, y0 + dy * k) for k in range(n + 1)], color)
+
+    # Arc around cx, cy from angle start, sweep radians in the direction of increasing angle
+    def arc(self, cx, cy, r, start, sweep, color):
+        n = int(sweep * r) + 1
+        if n < 4:
+            self.plot(cx + math.cos(start + sweep / 2) * r, cy + math.sin(start + sweep / 2) * r, color)
+            return
+        step = sweep / n
+        cos = math.cos
+        sin = math.sin
+        self.points([(cx + cos(start + step * k) * r, cy + sin(start + step * k) * r) for k in range(n + 1)], color)
+
+    # Same as plot() for many points, the hot loop of rasterize()
+    def points(self, points, color):
+        width = self.width
+        height = self.height
+        pixels = self.pixels
+        for x, y in points:
+            ix = int(x)
+            iy = int(y)
+            if 0 <= ix < width and 0 <= iy < height:
+                idx = (iy * width + ix) * 3
+                pixels[idx:idx + 3] = color
+
+    def png(self):
+        stride = self.width * 3
+        raw = b"".join(b"\x00" + self.pixels[y * stride:(y + 1) * stride] for y in range(self.height))
+
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        return (b"\x89PNG\r\n\x1a\n" +
+                chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)) +
+                chunk(b"IDAT", zlib.compress(raw, 6)) +
+                chunk(b"IEND", b""))
+
+
+# Draws the primitives of a Drawer scaled so that the longer side of the page is size pixels.
+# Texts are drawn as a line along their baseline, as long as the text would be.
+def rasterize(d, size=SIZE):
+    pageWidth = math.ceil(d.bounds[2] + d.margin)
+    pageHeight = math.ceil(d.bounds[3] + d.margin)
+    scale = size / max(pageWidth, pageHeight, 1)
+    img = Raster(max(1, round(pageWidth * scale)), max(1, round(pageHeight * scale)))
+    colors = [bytes(rgb(c)) for c in d.colorTable]
+    for i in range(len(d)):
+        kind = d.kinds[i]
+        color = colors[d.colors[i]]
+        if color == b"\xff\xff\xff":
+            continue
+        x0 = d.x0[i] * scale
+        y0 = d.y0[i] * scale
+        if kind == Drawer.LINE:
+            img.line(x0, y0, d.x1[i] * scale, d.y1[i] * scale, color)
+        elif kind == Drawer.CIRCLE:
+            img.arc(x0, y0, d.r[i] * scale, 0, 2 * math.pi, color)
+        elif kind == Drawer.ARC:
+            img.arc(x0, y0, d.r[i] * scale, d.x1[i], arcSweep(d, i), color)
+        else:
+            length = len(d.texts[d.refs[i]]) * d.r[i] * 0.6 * scale
+            anchor = d.styleTable[d.styles[i]][0]
+            offset = {"start": 0, "middle": -length / 2, "end": -length}.get(anchor, 0)
+            angle = math.radians(d.x1[i]) if d.y1[i] else 0
+            c = math.cos(angle)
+            s = math.sin(angle)
+            img.line(x0 + c * offset, y0 + s * offset, x0 + c * (offset + length), y0 + s * (offset + length), color)
+    return img
+
+
+def writePNG(d, path, size=SIZE):
+    with open(path, "wb") as f:
+        f.write(rasterize(d, size).png())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a jig or template and write a PNG thumbnail of it.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('kind', choices=["jig", "template"], help="What to generate")
+    parser.add_argument('params', nargs="*", help="Generator options as name=value, e.g. shape=narrow")
+    parser.add_argument('--output', help="PNG file, stdout if not given")
+    parser.add_argument('--size', type=int, default=SIZE, help="Pixels of the longer side")
+
+    args = parser.parse_args()
+    utils.debug = False
+
+    d = generate(args.kind, parseParams(args.params))
+    data = rasterize(d, args.size).png()
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(data)
+    else:
+        sys.stdout.buffer.write(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import utils
+from cache import KINDS, MAX_BYTES, SVGCache
+
+# Largest accepted request body, parameter sets are tiny
+MAX_BODY = 1 << 20
+# Requests whose latency is kept for the percentiles in /metrics
+LATENCY_WINDOW = 10000
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 60
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+# Per-process cache, set up by initWorker()
+cache = None
+
+
+def initWorker(cacheDir=None, cacheBytes=None):
+    global cache
+    utils.debug = False
+    # Shutdown is up to the server process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cacheDir:
+        cache = SVGCache(cacheDir, cacheBytes or MAX_BYTES)
+
+
+# Renders one parameter set in a worker process, returns the SVG bytes
+def renderSVG(kind, params, precision=None):
+    if cache is not None:
+        return cache.render(kind, params, precision)
+    paramsFn, drawFn = KINDS[kind]
+    d = drawFn(paramsFn(params))
+    d.precision = precision
+    return d.toSVG().encode()
+
+
+# Renders a small jig, so that the worker has everything imported and warmed up before the first request
+def warmUp():
+    renderSVG('jig', {'steps': 1, 'subSteps': 1})
+    return os.getpid()
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Request counts and latencies, reported by GET /metrics
+class Metrics:
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.inFlight = 0
+        self.connections = 0
+        self.reused = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        # Completion times of the latest requests, for the current throughput
+        self.finished = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds, failed):
+        self.requests += 1
+        self.errors += failed
+        self.latencies.append(seconds)
+        self.finished.append(time.monotonic())
+
+    def report(self):
+        now = time.monotonic()
+        uptime = now - self.start
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+
+        recent = [t for t in self.finished if t > now - 10]
+        return {
+            'uptimeSeconds': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'inFlight': self.inFlight,
+            'connections': self.connections,
+            'keepAliveRequests': self.reused,
+            'requestsPerSecond': self.requests / uptime if uptime else 0,
+            'recentRequestsPerSecond': len(recent) / min(10, uptime) if uptime else 0,
+            'latencyMs': {'p50': percentile(0.5), 'p90': percentile(0.9), 'p99': percentile(0.99),
+                          'max': latencies[-1] * 1000 if latencies else 0},
+        }
+
+
+# Serves POST /jig and POST /template (JSON parameters in, SVG out), GET /metrics and GET /health.
+# Rendering runs in a pool of warm worker processes, the event loop only parses and routes requests.
+class RenderServer:
+
+    def __init__(self, workers=None, cacheDir=None, cacheBytes=None):
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initWorker,
+                                        initargs=(cacheDir, cacheBytes))
+        self.metrics = Metrics()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        loop = asyncio.get_running_loop()
+        # One warm-up task per worker starts all of them before the first request
+        pids = await asyncio.gather(*[loop.run_in_executor(self.pool, warmUp) for _ in range(self.workers)])
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.metrics = Metrics()
+        return len(set(pids))
+
+    def close(self):
+        self.server.close()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        self.metrics.connections += 1
+        served = 0
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                start = time.perf_counter()
+                self.metrics.inFlight += 1
+                keepAlive = False
+                body = None
+                try:
+                    method, target, version, headers = self.parseHead(head)
+                    keepAlive = self.keepAlive(version, headers)
+                    body = await self.readBody(reader, headers)
+                    status, contentType, data = await self.route(method, target, body)
+                except HTTPError as e:
+                    status, contentType, data = e.status, "application/json", self.errorBody(str(e))
+                except Exception as e:
+                    status, contentType, data = 500, "application/json", self.errorBody(f"{type(e).__name__}: {e}")
+                finally:
+                    self.metrics.inFlight -= 1
+                if body is None:
+                    # The rest of the request is still in the stream
+                    keepAlive = False
+                writer.write(self.responseHead(status, contentType, len(data), keepAlive) + data)
+                await writer.drain()
+                self.metrics.record(time.perf_counter() - start, status >= 400)
+                self.metrics.reused += served > 0
+                served += 1
+                if not keepAlive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def parseHead(self, head):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HTTPError(400, f"Malformed request line: {lines[0]!r}")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
+
+    def keepAlive(self, version, headers):
+        connection = headers.get('connection', "").lower()
+        if version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def readBody(self, reader, headers):
+        if 'transfer-encoding' in headers:
+            raise HTTPError(411, "Chunked requests are not supported, send a Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY:
+            raise HTTPError(413, f"Request body over {MAX_BODY} bytes")
+        return await reader.readexactly(length) if length else b""
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path.strip("/")
+        if path == "health":
+            return 200, "text/plain", b"ok\n"
+        if path == "metrics":
+            return 200, "application/json", json.dumps(self.metrics.report(), indent=2).encode()
+        if path not in KINDS:
+            raise HTTPError(404, f"Unknown path: {url.path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST with the parameters as a JSON object")
+        try:
+            params = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(params, dict):
+            raise HTTPError(400, "Parameters must be a JSON object")
+        query = parse_qs(url.query)
+        try:
+            precision = int(query['precision'][0]) if 'precision' in query else None
+        except ValueError:
+            raise HTTPError(400, f"Invalid precision: {query['precision'][0]}")
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(self.pool, renderSVG, path, params, precision)
+        except (ValueError, AssertionError) as e:
+            raise HTTPError(400, f"{type(e).__name__}: {str(e) or 'inconsistent parameters'}")
+        return 200, "image/svg+xml", data
+
+    def errorBody(self, message):
+        return json.dumps({'error': message}).encode()
+
+    def responseHead(self, status, contentType, length, keepAlive):
+        return (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: {contentType}\r\n"
+                f"Content-Length: {length}\r\n"
+                f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n").encode()
+
+
+async def serve(host, port, workers, cacheDir, cacheBytes):
+    server = RenderServer(workers, cacheDir, cacheBytes)
+    started = await server.start(host, port)
+    print(f"Serving on http://{host}:{port} with {started} workers", file=sys.stderr)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    await stop.wait()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve jig and template rendering over HTTP on a local port.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1", help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, all cores if not given")
+    parser.add_argument('--cacheDir', help="Reuse rendered SVGs from this cache directory")
+    parser.add_argument('--cacheBytes', type=int, default=MAX_BYTES, help="Cache size budget in bytes")
+
+    args = parser.parse_args()
+    utils.debug = False
+    asyncio.run(serve(args.host, args.port, args.workers, args.cacheDir, args.cacheBytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import math
+
+from paths import TOLERANCE, segmentEnds
+from utils import Drawer, GridIndex, UnionFind
+
+# Coordinates closer than this are the same when comparing sub-drawings, in mm
+RESOLUTION = 1e-6
+
+
+# Groups the rows of one phase into sub-drawings: rows whose end points touch, or whose bounding box
+# holds the other's, like the cross and the holes of a screw or the arcs and lines of a rail
+def clusters(d, rows, tol=TOLERANCE):
+    sets = UnionFind(rows)
+    boxes = {i: d.extent([i]) for i in rows}
+    area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes.values())
+    index = GridIndex(max(math.sqrt(area / len(rows)) if rows else 1, 1e-3))
+    for i in rows:
+        index.insert(i, *boxes[i])
+    for i in rows:
+        a = boxes[i]
+        for j in index.query(*a, tol):
+            if j <= i or sets.find(i) == sets.find(j):
+                continue
+            b = boxes[j]
+            inside = ((a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]) or
+                      (b[0] <= a[0] and b[1] <= a[1] and b[2] >= a[2] and b[3] >= a[3]))
+            if inside or (d.kinds[i] != Drawer.CIRCLE and d.kinds[j] != Drawer.CIRCLE and
+                          any(math.dist(p, q) <= tol for p in segmentEnds(d, i) for q in segmentEnds(d, j))):
+                sets.union(i, j)
+    groups = {}
+    for i in rows:
+        groups.setdefault(sets.find(i), []).append(i)
+    return list(groups.values())
+
+
+# Position and rotation of a sub-drawing: the anchor of its first row, and the direction of its first line,
+# arc or circle away from the anchor. Never rotated if turning is False.
+def placement(d, rows, turning=True):
+    x = d.x0[rows[0]]
+    y = d.y0[rows[0]]
+    if turning:
+        for i in rows:
+            kind = d.kinds[i]
+            if kind == Drawer.LINE:
+                return x, y, math.atan2(d.y1[i] - d.y0[i], d.x1[i] - d.x0[i])
+            if kind == Drawer.ARC:
+                return x, y, d.x1[i]
+            if d.x0[i] != x or d.y0[i] != y:
+                return x, y, math.atan2(d.y0[i] - y, d.x0[i] - x)
+    return x, y, 0
+
+
+# Rows moved so that the placement is at the origin and turned back by its angle, as
+# (kind, color, style, ref, x0, y0, x1, y1, r)
+def canonical(d, rows, x, y, angle):
+    c = math.cos(-angle)
+    s = math.sin(-angle)
+    result = []
+    for i in rows:
+        kind = d.kinds[i]
+        dx = d.x0[i] - x
+        dy = d.y0[i] - y
+        x0 = dx * c - dy * s
+        y0 = dx * s + dy * c
+        x1 = d.x1[i]
+        y1 = d.y1[i]
+        if kind == Drawer.LINE:
+            dx = x1 - x
+            dy = y1 - y
+            x1 = dx * c - dy * s
+            y1 = dx * s + dy * c
+        elif kind == Drawer.ARC:
+            x1 = (x1 - angle) % (2 * math.pi)
+            y1 = (y1 - angle) % (2 * math.pi)
+        result.append((kind, d.colors[i], d.styles[i], d.refs[i], x0, y0, x1, y1, d.r[i]))
+    return result
+
+
+# Key under which equal sub-drawings meet
+def signature(rows):
+    return tuple(row[:4] + tuple(round(v / RESOLUTION) for v in row[4:]) for row in rows)
+
+
+# Symbol body drawn around the origin, rounding away the noise of turning it back
+def symbolBody(d, rows):
+    body = Drawer()
+    for kind, color, style, ref, x0, y0, x1, y1, r in rows:
+        body.add(kind, round(x0, 9) + 0.0, round(y0, 9) + 0.0, round(x1, 9) + 0.0, round(y1, 9) + 0.0, r,
+                 d.colorTable[color], d.styleTable[style], ref)
+    return body
+
+
+# Adds a symbol for a list of occurrences (rows, x, y, angle) if that makes the SVG smaller
+def addSymbol(d, occurrences, body):
+    symbol = len(d.symbols)
+    before = sum(len(d.markup(i)) for rows, _, _, _ in occurrences for i in rows)
+    d.symbols.append(body)
+    for rows, x, y, angle in occurrences:
+        d.addUse(rows, symbol, x, y, math.degrees(angle))
+    after = len(d.symbolMarkup(symbol))
+    after += sum(len(d.useMarkup(u)) for u in range(len(d.uses) - len(occurrences), len(d.uses)))
+    if after >= before:
+        d.symbols.pop()
+        for rows, _, _, _ in occurrences:
+            d.uses.pop()
+            for i in rows:
+                del d.symbolRows[i]
+        return False
+    return True
+
+
+# Emits repeated geometry once, in <defs>, and references it with <use> elements moved and rotated in place.
+# First whole phases that repeat the start of an earlier phase of the same name, like the pin grid and outline
+# of the second layer, then sub-drawings repeated within and across phases, like screw holes, rails and ticks.
+# Text is left alone. The rows themselves are kept for other outputs. Returns the element counts before and after.
+def useSymbols(d):
+    before = d.elementCount()
+    free = [i for i in range(len(d)) if d.kinds[i] != Drawer.TEXT and i not in d.pathRows and i not in d.symbolRows]
+    byPhase = {}
+    for i in free:
+        byPhase.setdefault(d.phaseIds[i], []).append(i)
+
+    # Whole phases
+    seen = {}
+    for phase, rows in byPhase.items():
+        name = d.phaseTable[phase][0]
+        x, y, _ = placement(d, rows, turning=False)
+        rows0 = canonical(d, rows, x, y, 0)
+        key = signature(rows0)
+        for match in seen.get(name, []):
+            other, otherRows, otherX, otherY = match
+            prefix = otherRows[:len(rows)]
+            if len(rows) > 1 and signature(canonical(d, prefix, otherX, otherY, 0)) == key:
+                if addSymbol(d, [(prefix, otherX, otherY, 0), (rows, x, y, 0)], symbolBody(d, rows0)):
+                    byPhase[phase] = []
+                    byPhase[other] = otherRows[len(rows):]
+                    seen[name].remove(match)
+                break
+        else:
+            seen.setdefault(name, []).append((phase, rows, x, y))
+
+    # Sub-drawings
+    groups = {}
+    for rows in byPhase.values():
+        for cluster in clusters(d, rows):
+            x, y, angle = placement(d, cluster)
+            rows0 = canonical(d, cluster, x, y, angle)
+            groups.setdefault(signature(rows0), (rows0, []))[1].append((cluster, x, y, angle))
+    for rows0, occurrences in groups.values():
+        if len(occurrences) > 1:
+            addSymbol(d, occurrences, symbolBody(d, rows0))
+    return before, d.elementCount()
@@ -0,0 +1,154 @@
+import math
+from array import array
+
+from utils import Drawer, dbg, flag, unit, unitStr
+
+ANG_90 = 90
+ANG_180 = 180
+
+ANGLES = [ANG_90, ANG_180]
+
+marks = [15, 18, 22.5, 30, 36, 45, 60, 67.5, 72, 75]
+# (cos, sin) of each mark, computed once
+markDirections = [(math.cos(math.radians(mark)), math.sin(math.radians(mark))) for mark in marks]
+
+# Parameters as accepted by the command line, with their defaults
+DEFAULTS = {
+    'minRadius': "1cm",
+    'maxRadius': "20cm",
+    'stepSize': "1cm",
+    'inches': False,
+    'angles': ANG_90,
+    'fence': False,
+}
+
+
+# Fills in defaults and converts all dimensions to mm
+def templateParams(params=None):
+    p = dict(DEFAULTS)
+    p.update(params or {})
+    unknown = set(p) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown template parameters: {', '.join(sorted(unknown))}")
+    if int(p['angles']) not in ANGLES:
+        raise ValueError(f"Unknown angles: {p['angles']}")
+    return {
+        'minRadius': unit(p['minRadius']),
+        'maxRadius': unit(p['maxRadius']),
+        'stepSize': unit(p['stepSize']),
+        'inches': flag(p['inches']),
+        'angles': int(p['angles']),
+        'fence': flag(p['fence']),
+    }
+
+
+# Generates a template set, returns a Drawer. Params use the command line names and formats.
+# A utils.Profiler passed as profiler collects per-phase statistics.
+def generate_template(params=None, argv=None, profiler=None):
+    return drawTemplate(templateParams(params), argv, profiler)
+
+
+# Draws a template set from already converted parameters, see templateParams()
+def drawTemplate(p, argv=None, profiler=None):
+    minRadius = p['minRadius']
+    maxRadius = p['maxRadius']
+    stepSize = p['stepSize']
+    angles = p['angles']
+    fence = p['fence']
+
+    assert maxRadius >= minRadius, f'maxRadius={maxRadius} minRadius={minRadius}'
+    numSteps = (maxRadius - minRadius) / stepSize
+    assert numSteps == int(numSteps)
+    numSteps = int(numSteps)
+    assert minRadius >= stepSize
+
+    d = Drawer(profiler=profiler)
+
+    # Print command line
+    with d.phase("commandLine"):
+        for idx, arg in enumerate(argv or []):
+            d.text(3, 3 + idx * 3, arg, fs=3, anchor="start", color=d.MARK)
+
+    cx = 10 + maxRadius
+    cy = 10 + maxRadius
+
+    radii = [minRadius + step * stepSize for step in range(0, numSteps + 1)]
+    dbg(f'stepSize={stepSize}, {len(radii)} steps')
+
+    with d.phase("arcs"):
+        if minRadius > stepSize:
+            # Draw an extra initial arc
+            d.arc(cx, cy, minRadius - stepSize, 45, 45, color=d.CUT, degrees=True, reverse=True)
+        if angles == ANG_90:
+            d.arcs(cx, cy, radii, 45, 45, color=d.CUT, degrees=True, reverse=True)
+
+    if angles == ANG_90:
+        with d.phase("labels"):
+            textRadii = [math.sqrt((radius-stepSize/2) ** 2 / 2) for radius in radii]
+            d.labels([cx + t for t in textRadii], [cy - t for t in textRadii], [unitStr(r) for r in radii],
+                     fs=3, color=d.MARK)
+
+        with d.phase("ticks"):
+            # Ticks from the inner and the outer arc of each step, only the outer ones are labelled
+            ticks = []
+            for radius in radii:
+                ticks.append((radius - stepSize, radius - stepSize + 2))
+                ticks.append((radius, radius - 2))
+            x0, y0, x1, y1 = array('d'), array('d'), array('d'), array('d')
+            for cos, sin in markDirections:
+                x0.extend([cx + cos * r0 for r0, _ in ticks])
+                y0.extend([cy - sin * r0 for r0, _ in ticks])
+                x1.extend([cx + cos * r1 for _, r1 in ticks])
+                y1.extend([cy - sin * r1 for _, r1 in ticks])
+            d.lines(x0, y0, x1, y1)
+            outer = range(1, len(x1), 2)
+            d.labels([x1[i] for i in outer], [y1[i] for i in outer],
+                     [mark for mark in marks for _ in radii], fs=2)
+
+        if fence:
+            with d.phase("fences"):
+                # Draw fences
+                #   2---------3
+                #    \       /
+                # 0---1     4---5
+                xs = (0, stepSize * 3 / 8, stepSize * 2 / 8, stepSize * 6 / 8, stepSize * 5 / 8, stepSize)
+                ys = (0, 0, 0 - stepSize / 8, 0 - stepSize / 8, 0, 0)
+                x0, y0, x1, y1 = array('d'), array('d'), array('d'), array('d')
+                for k in range(5):
+                    for radius in radii:
+                        start = radius - stepSize
+                        # Lower fence
+                        x0.append(cx + (start + xs[k]))
+                        y0.append(cy + ys[k])
+                        x1.append(cx + (start + xs[k + 1]))
+                        y1.append(cy + ys[k + 1])
+                        # Left fence
+                        x0.append(cx - ys[k])
+                        y0.append(cy - (start + xs[k]))
+                        x1.append(cx - ys[k + 1])
+                        y1.append(cy - (start + xs[k + 1]))
+                d.lines(x0, y0, x1, y1, d.CUT)
+
+    with d.phase("edges"):
+        if fence:
+            # Final fences
+            x0, y0 = 0, 0
+            x1, y1 = 0, 10
+            x2, y2 = maxRadius, 10
+            x3, y3 = maxRadius, 0
+            # Lower
+            d.line(cx + x0, cy + y0, cx + x1, cy + y1, d.CUT)
+            d.line(cx + x1, cy + y1, cx + x2, cy + y2, d.CUT)
+            d.line(cx + x2, cy + y2, cx + x3, cy + y3, d.CUT)
+            # Left
+            d.line(cx - y0, cy - x0, cx - y1, cy - x1, d.CUT)
+            d.line(cx - y1, cy - x1, cx - y2, cy - x2, d.CUT)
+            d.line(cx - y2, cy - x2, cx - y3, cy - x3, d.CUT)
+        else:
+            # Final cut
+            x0, y0 = minRadius - stepSize, 0
+            x1, y1 = maxRadius, 0
+            d.line(cx + x0, cy + y0, cx + x1, cy + y1, d.CUT)
+            d.line(cx - y0, cy - x0, cx + y1, cy - x1, d.CUT)
+
+    return d
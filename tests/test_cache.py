@@ -0,0 +1,57 @@
+import os
+
+from cache import EVICT_TO, LOCK_FILE, SVGCache
+
+
+def onDisk(directory):
+    return sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith(".svg"))
+
+
+def counted(directory):
+    with open(os.path.join(directory, LOCK_FILE)) as f:
+        return int(f.read())
+
+
+def test_hit_and_miss(tmp_path):
+    cache = SVGCache(str(tmp_path))
+    first = cache.render('template')
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.render('template') == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Equal dimensions in other units share the entry
+    cache.render('jig', {'minRadius': '6in'})
+    cache.render('jig', {'minRadius': '152.4mm'})
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.render('template', precision=2)
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    other = SVGCache(str(tmp_path))
+    assert other.render('template') == first
+    assert (other.hits, other.misses) == (1, 0)
+    assert other.stats()['entries'] == 3
+    assert other.stats()['bytes'] == onDisk(tmp_path) == counted(tmp_path)
+
+
+def test_eviction_across_instances(tmp_path):
+    budget = 1000
+    caches = [SVGCache(str(tmp_path), budget), SVGCache(str(tmp_path), budget)]
+    for k in range(20):
+        key = f"{k:04d}"
+        caches[k % 2].put(key, bytes(300))
+        total = onDisk(tmp_path)
+        assert total == counted(tmp_path)
+        assert total <= budget
+        # The newest entry is kept, the oldest go first
+        assert caches[(k + 1) % 2].get(key) == bytes(300)
+        if k >= 3:
+            assert total <= budget * EVICT_TO
+            assert caches[k % 2].get(f"{k - 3:04d}") is None
+
+
+def test_size_recounted_on_open(tmp_path):
+    cache = SVGCache(str(tmp_path))
+    cache.put("a", bytes(100))
+    with open(os.path.join(tmp_path, LOCK_FILE), "w") as f:
+        f.write("12345")
+    SVGCache(str(tmp_path))
+    assert counted(tmp_path) == 100
@@ -0,0 +1,99 @@
+import io
+import math
+
+import pytest
+
+from gcode import toolpath, writeGCode
+from jig import generate
+from paths import contourBox, cutRows
+from utils import Drawer, arcSweep
+
+CASES = [
+    ('jig', {'shape': 'narrow', 'layers': 'double'}),
+    ('jig', {'shape': 'line', 'layers': 'support'}),
+    ('jig', {'shape': 'rectangle', 'screwRails': '0,90,180:20:40:6:10'}),
+    ('template', {'fence': True}),
+]
+# G-code coordinates are written with 4 decimals
+TOL = 1e-3
+
+
+# Moves of a G-code program as (command, start, words)
+def moves(text):
+    pos = (0, 0)
+    result = []
+    for line in text.splitlines():
+        cmd, *rest = line.split()
+        words = {w[0]: float(w[1:]) for w in rest}
+        if cmd in ("G0", "G1", "G2", "G3") and "X" in words:
+            result.append((cmd, pos, words))
+            pos = (words['X'], words['Y'])
+    return result
+
+
+# Part of the circle around c from a to b, clockwise for G2: returns the sweep and the middle point
+def arcMiddle(cmd, a, b, c):
+    sa = math.atan2(a[1] - c[1], a[0] - c[0])
+    sb = math.atan2(b[1] - c[1], b[0] - c[0])
+    sweep = (sa - sb if cmd == "G2" else sb - sa) % (2 * math.pi)
+    if sweep < 1e-9:
+        sweep = 2 * math.pi
+    mid = sa - sweep / 2 if cmd == "G2" else sa + sweep / 2
+    r = math.dist(a, c)
+    return sweep, (c[0] + r * math.cos(mid), c[1] + r * math.sin(mid))
+
+
+@pytest.mark.parametrize("kind,params", CASES)
+def test_arcs_follow_the_drawing(kind, params):
+    d = generate(kind, params)
+    order, _, _ = toolpath(d, cutRows(d))
+    out = io.StringIO()
+    writeGCode(d, order, out)
+    height = max(contourBox(d, c)[3] for c in order)
+
+    curves = [i for i in cutRows(d) if d.kinds[i] in (Drawer.ARC, Drawer.CIRCLE)]
+    arcs = 0
+    for cmd, start, words in moves(out.getvalue()):
+        if cmd not in ("G2", "G3"):
+            continue
+        arcs += 1
+        end = (words['X'], words['Y'])
+        center = (start[0] + words['I'], start[1] + words['J'])
+        r = math.dist(start, center)
+        assert math.dist(end, center) == pytest.approx(r, abs=TOL)
+        sweep, mid = arcMiddle(cmd, start, end, center)
+        # Half circles are split, a controller could swing them either way
+        assert abs(sweep - math.pi) > 1e-6
+
+        # Back in drawing coordinates the move must run along a CUT arc or circle of the Drawer
+        cx, cy = center[0], height - center[1]
+        angle = math.atan2(height - mid[1] - cy, mid[0] - cx)
+        matches = []
+        for i in curves:
+            if abs(d.x0[i] - cx) > TOL or abs(d.y0[i] - cy) > TOL or abs(d.r[i] - r) > TOL:
+                continue
+            if d.kinds[i] == Drawer.CIRCLE:
+                matches.append(i)
+            elif (angle - d.x1[i]) % (2 * math.pi) <= arcSweep(d, i) and sweep <= arcSweep(d, i) + 1e-6:
+                matches.append(i)
+        assert matches, f"{cmd} {words} is not on a cut of the drawing"
+    assert arcs >= len(curves)
+
+
+def test_contours_and_circles():
+    d = generate('jig', {'shape': 'narrow'})
+    rows = cutRows(d)
+    order, before, after = toolpath(d, rows)
+    out = io.StringIO()
+    writeGCode(d, order, out)
+    text = out.getvalue()
+    assert text.startswith("G21\nG90\n") and text.endswith("M2\n")
+    rapids = [m for m in moves(text) if m[0] == "G0"]
+    assert len(rapids) == len(order)
+    # Every cut row is cut exactly once
+    assert sorted(i for c in order for i, _ in c.rows) == sorted(rows)
+    circles = [m for m in moves(text) if m[0] == "G2" and m[2]['J'] == 0 and m[1] == (m[2]['X'], m[2]['Y'])]
+    assert len(circles) == sum(1 for i in rows if d.kinds[i] == Drawer.CIRCLE)
+    for _, _, words in circles:
+        assert words['I'] < 0
+    assert after <= before
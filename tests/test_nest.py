@@ -0,0 +1,56 @@
+import pytest
+
+from jig import generate
+from nest import nest, partsOf
+
+
+# A 100mm square template, repeated
+def squares(n):
+    d = generate('template', {'minRadius': '20mm', 'maxRadius': '100mm'})
+    return [part for k in range(n) for part in partsOf(f"t{k}", d)]
+
+
+def mixed():
+    parts = []
+    for k in range(6):
+        parts += partsOf(f"j{k}", generate('jig', {'shape': 'narrow', 'layers': 'double'}))
+        parts += partsOf(f"w{k}", generate('jig', {'shape': 'wide'}))
+        parts += partsOf(f"t{k}", generate('template', {'minRadius': '20mm', 'maxRadius': '100mm'}))
+    return parts
+
+
+# Placed boxes never overlap and keep gap between each other and edge to the sheet border
+def assertPlacedApart(sheets, edge, gap):
+    for sheet in sheets:
+        boxes = []
+        for part, x, y, rotated in sheet.placements:
+            w, h = (part.height, part.width) if rotated else (part.width, part.height)
+            assert edge - 1e-9 <= x and x + w <= sheet.width - edge + 1e-9
+            assert edge - 1e-9 <= y and y + h <= sheet.height - edge + 1e-9
+            boxes.append((x, y, x + w, y + h))
+        for k, a in enumerate(boxes):
+            for b in boxes[:k]:
+                apart = max(b[0] - a[2], a[0] - b[2], b[1] - a[3], a[1] - b[3])
+                assert apart >= gap - 1e-9
+
+
+@pytest.mark.parametrize("gap,counts", [(0, [16]), (5, [9, 7])])
+def test_squares_tile_the_sheet(gap, counts):
+    # 400mm between the edges: 4 by 4 squares touching, or 3 by 3 with gaps
+    sheets = nest(squares(16), 420, 420, edge=10, gap=gap)
+    assert [len(s.placements) for s in sheets] == counts
+    assertPlacedApart(sheets, 10, gap)
+
+
+@pytest.mark.parametrize("gap,sheetCount", [(0, 2), (5, 3), (20, 3)])
+def test_mixed_parts(gap, sheetCount):
+    parts = mixed()
+    sheets = nest(parts, 800, 800, edge=10, gap=gap)
+    assert len(sheets) == sheetCount
+    assert sum(len(s.placements) for s in sheets) == len(parts)
+    assertPlacedApart(sheets, 10, gap)
+
+
+def test_part_too_large():
+    with pytest.raises(ValueError):
+        nest(squares(1), 100, 100, edge=10, gap=0)
@@ -0,0 +1,61 @@
+import os
+import re
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:e-?\d+)?")
+
+# Outputs of the scripts before any of the backlog changes, data/<name>.svg
+CASES = {
+    'jig-default': ["circle-jig-gen.py"],
+    'jig-narrow-double': ["circle-jig-gen.py", "--shape", "narrow", "--layers", "double"],
+    'jig-line-support': ["circle-jig-gen.py", "--shape", "line", "--layers", "support"],
+    'jig-wide': ["circle-jig-gen.py", "--shape", "wide", "--minRadius", "10cm", "--stepSize", "2cm",
+                 "--bitDiam", "12mm"],
+    'jig-inches': ["circle-jig-gen.py", "--inches", "--shape", "narrow"],
+    'template-default': ["circle-template-gen.py"],
+    'template-fence': ["circle-template-gen.py", "--fence"],
+    'template-inches': ["circle-template-gen.py", "--inches", "--minRadius", "1", "--maxRadius", "6",
+                        "--stepSize", "0.5"],
+}
+
+
+def run(argv):
+    return subprocess.run([sys.executable, *argv], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+
+# Elements of an SVG as a multiset of (tag, attributes, text). Numbers are rounded, since "3.0" is
+# written as "3" now, and the order is ignored, since templates now draw all ticks of a radius at once.
+def elements(svg):
+    def rounded(v):
+        return NUMBER.sub(lambda m: repr(round(float(m.group()), 6) + 0.0), v)
+
+    result = Counter()
+    for el in ET.fromstring(svg).iter():
+        attrs = tuple(sorted((k, rounded(v)) for k, v in el.attrib.items()))
+        result[(el.tag, attrs, (el.text or "").strip())] += 1
+    return result
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_plain_output_matches_baseline(name):
+    with open(os.path.join(DATA, name + ".svg")) as f:
+        expected = f.read()
+    assert elements(run(CASES[name])) == elements(expected)
+
+
+def test_dxf_output_lists_every_circle(tmp_path):
+    out = [str(tmp_path / "jig.svg"), str(tmp_path / "jig.dxf")]
+    run(["circle-jig-gen.py", "--shape", "narrow", "--output", *out])
+    with open(out[0]) as f:
+        svg = elements(f.read())
+    circles = sum(n for (tag, _, _), n in svg.items() if tag.endswith("}circle"))
+    with open(out[1]) as f:
+        dxf = f.read().split("\n")
+    assert sum(1 for line in dxf if line.strip() == "CIRCLE") == circles
@@ -0,0 +1,112 @@
+import math
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import pytest
+
+from jig import generate
+from paths import mergePaths
+from symbols import useSymbols
+
+SVG = "{http://www.w3.org/2000/svg}"
+HREF = "{http://www.w3.org/1999/xlink}href"
+TOKEN = re.compile(r"[MLAZ]|-?\d+(?:\.\d+)?(?:e-?\d+)?")
+
+CASES = [
+    ('jig', {}),
+    ('jig', {'shape': 'narrow', 'layers': 'double'}),
+    ('jig', {'shape': 'line', 'layers': 'support'}),
+    ('jig', {'shape': 'rectangle', 'screwRails': '0,90,180:20:40:6:10'}),
+    ('template', {}),
+    ('template', {'fence': True, 'minRadius': '5mm', 'stepSize': '5mm'}),
+]
+
+
+def rounded(*vs):
+    return tuple(round(v, 3) + 0.0 for v in vs)
+
+
+# Maps x, y through translate(tx ty) rotate(angle)
+def transform(tx, ty, angle):
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    return lambda x, y: (tx + x * c - y * s, ty + x * s + y * c)
+
+
+# Lines, arcs and circles drawn by an SVG with <use> expanded and paths split into segments.
+# Lines are unordered pairs of end points and arcs are turned to run with sweep flag 1.
+def shapes(svg):
+    root = ET.fromstring(svg)
+    symbols = {g.get('id'): list(g) for g in root.iter(SVG + "g") if g.get('id')}
+    result = Counter()
+
+    def add(el, at):
+        stroke = el.get('stroke')
+        tag = el.tag[len(SVG):]
+        if tag == "line":
+            a = at(float(el.get('x1')), float(el.get('y1')))
+            b = at(float(el.get('x2')), float(el.get('y2')))
+            result[('line', stroke) + tuple(sorted([rounded(*a), rounded(*b)]))] += 1
+        elif tag == "circle":
+            c = at(float(el.get('cx')), float(el.get('cy')))
+            result[('circle', stroke, rounded(*c, float(el.get('r'))))] += 1
+        elif tag == "path":
+            tokens = TOKEN.findall(el.get('d'))
+            start = pos = None
+            k = 0
+            while k < len(tokens):
+                cmd = tokens[k]
+                if cmd == "M":
+                    start = pos = (float(tokens[k + 1]), float(tokens[k + 2]))
+                    k += 3
+                elif cmd == "L" or cmd == "Z":
+                    end = start if cmd == "Z" else (float(tokens[k + 1]), float(tokens[k + 2]))
+                    k += 1 if cmd == "Z" else 3
+                    if cmd == "Z" and rounded(*end) == rounded(*pos):
+                        continue
+                    a, b = rounded(*at(*pos)), rounded(*at(*end))
+                    result[('line', stroke) + tuple(sorted([a, b]))] += 1
+                    pos = end
+                elif cmd == "A":
+                    r, _, _, large, sweep, x, y = (float(t) for t in tokens[k + 1:k + 8])
+                    k += 8
+                    a, b = rounded(*at(*pos)), rounded(*at(x, y))
+                    if not sweep:
+                        a, b = b, a
+                    result[('arc', stroke, rounded(r), int(large), a, b)] += 1
+                    pos = (x, y)
+                else:
+                    raise ValueError(f"Unexpected path command {cmd}")
+        elif tag == "use":
+            ref = el.get(HREF)[1:]
+            m = re.match(r"translate\((\S+) (\S+)\)(?: rotate\((\S+)\))?", el.get('transform', ""))
+            if m:
+                inner = transform(float(m[1]), float(m[2]), float(m[3] or 0))
+            else:
+                inner = transform(float(el.get('x', 0)), float(el.get('y', 0)), 0)
+            for child in symbols[ref]:
+                add(child, lambda x, y: at(*inner(x, y)))
+        elif tag == "text":
+            result[('text', el.text) + tuple(sorted(el.attrib.items()))] += 1
+
+    for el in root:
+        if el.tag != SVG + "defs":
+            add(el, lambda x, y: (x, y))
+    return result
+
+
+@pytest.mark.parametrize("merge,symbols", [(True, False), (False, True), (True, True)])
+@pytest.mark.parametrize("kind,params", CASES)
+def test_passes_keep_geometry(kind, params, merge, symbols):
+    plain = generate(kind, params).toSVG()
+    d = generate(kind, params)
+    if merge:
+        mergePaths(d)
+    if symbols:
+        useSymbols(d)
+    svg = d.toSVG()
+    if merge:
+        assert "<path d=\"M" in svg
+    if symbols:
+        assert "<use " in svg
+    assert shapes(svg) == shapes(plain)
@@ -1,12 +1,23 @@
+import io
+import json
 import math
 import sys
-import xml.etree.ElementTree as ET
+import time
+from array import array
+from contextlib import contextmanager
+
+# Bump whenever the generated geometry or markup changes, invalidates cached output
+VERSION = 3
 
 inches = False
+debug = True
 
 
 # Converts to mm
 def unit(v):
+    if not isinstance(v, str):
+        v = float(v)
+        return v * 25.4 if inches else v
     if v.endswith("mm"):
         return float(v[:-2])
     if v.endswith("cm"):
@@ -46,13 +57,54 @@ def unitStr(v):
         return str(v)
 
 
+# Escapes text content for XML
+def escape(s):
+    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# Parses a boolean flag, also from strings as found in CSV manifests
+def flag(v):
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "true", "yes", "y", "on")
+    return bool(v)
+
+
+# Formats a number, dropping the ".0" of whole numbers.
+# With precision, rounds to that many decimals and drops trailing zeros.
+def num(v, precision=None):
+    if precision is None:
+        s = repr(v)
+        return s[:-2] if s.endswith(".0") else s
+    s = f"{v:.{precision}f}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+
+# Opens an output file for writing text, gzip-compressed if it is named *.svgz or *.gz
+def openOutput(path):
+    if path.endswith((".svgz", ".gz")):
+        import gzip
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
 def dbg(s):
-    print(str(s), file=sys.stderr)
+    if debug:
+        print(str(s), file=sys.stderr)
 
 
 def err(s):
     print(str(s), file=sys.stderr)
-    sys.exit(0)
+    sys.exit(1)
+
+
+# Sweep of the arc in row i, in radians, in the direction of increasing angle
+def arcSweep(d, i):
+    sweep = (d.y1[i] - d.x1[i]) % (2 * math.pi)
+    if sweep < 1e-12:
+        sweep = 2 * math.pi
+    return sweep
 
 
 class Drawer:
@@ -68,13 +120,175 @@ class Drawer:
     ORANGE = "orange"
     NONE = "none"
 
-    def __init__(self, margin=10):
+    # Primitive kinds
+    LINE = 0
+    CIRCLE = 1
+    ARC = 2
+    TEXT = 3
+    KIND_NAMES = ["line", "circle", "arc", "text"]
+
+    # Number of primitives rendered per chunk written to the output
+    CHUNK = 1024
+
+    def __init__(self, margin=10, profiler=None, precision=None):
         self.margin = margin
+        # Decimals of coordinates in the output, full precision if None
+        self.precision = precision
         self.color = self.GREEN
         self.width = 0.3
         self.fill = self.NONE
-        self.content = ""
         self.bounds = [0, 0, 0, 0]
+        # Primitives are stored column-wise, one row per primitive:
+        #   LINE    from x0, y0 to x1, y1
+        #   CIRCLE  center x0, y0, radius r
+        #   ARC     center x0, y0, radius r, clockwise from angle x1 to y1 (radians), ref is the large-arc flag
+        #   TEXT    position x0, y0, font size r, rotation x1 (degrees), ref indexes texts
+        self.kinds = array('B')
+        self.x0 = array('d')
+        self.y0 = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.r = array('d')
+        self.colors = array('H')
+        self.styles = array('H')
+        self.refs = array('I')
+        self.phaseIds = array('H')
+        self.texts = []
+        # Interned colors and styles, referenced by index from the columns
+        self.colorTable = []
+        self.colorIndex = {}
+        self.styleTable = []
+        self.styleIndex = {}
+        self.styleMarkup = []
+        # Generating phases as (name, layer), the first one collects primitives drawn outside any phase
+        self.phaseTable = [("", 0)]
+        self.phaseIndex = {("", 0): 0}
+        self.currentPhase = 0
+        # Optional Profiler, timing phases and serialization
+        self.profiler = profiler
+        # Merged paths, see paths.mergePaths(): (first row, [(row, reverse)], closed).
+        # A path is emitted in place of its first row, its other rows are skipped.
+        self.paths = []
+        self.pathRows = {}
+        # Repeated sub-drawings, see symbols.useSymbols(): a Drawer with the body of each symbol in <defs>, and its uses
+        # as (first row, rows, symbol, x, y, angle). A use is emitted in place of its first row, its other rows are skipped.
+        self.symbols = []
+        self.uses = []
+        self.symbolRows = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def columns(self):
+        return [self.kinds, self.x0, self.y0, self.x1, self.y1, self.r, self.colors, self.styles, self.refs,
+                self.phaseIds]
+
+    def phaseId(self, name, layer=0):
+        key = (name, layer)
+        idx = self.phaseIndex.get(key)
+        if idx is None:
+            idx = self.phaseIndex[key] = len(self.phaseTable)
+            self.phaseTable.append(key)
+        return idx
+
+    # Tags everything drawn inside the block with a generating phase and layer
+    @contextmanager
+    def phase(self, name, layer=0):
+        previous = self.currentPhase
+        idx = self.currentPhase = self.phaseId(name, layer)
+        start = time.perf_counter() if self.profiler else 0
+        try:
+            yield
+        finally:
+            if self.profiler:
+                self.profiler.time(idx, time.perf_counter() - start)
+            self.currentPhase = previous
+
+    def colorId(self, color):
+        idx = self.colorIndex.get(color)
+        if idx is None:
+            idx = self.colorIndex[color] = len(self.colorTable)
+            self.colorTable.append(color)
+        return idx
+
+    # Styles are (fill, width, extra) for shapes and (anchor, extra) for text
+    def styleId(self, style):
+        idx = self.styleIndex.get(style)
+        if idx is None:
+            idx = self.styleIndex[style] = len(self.styleTable)
+            self.styleTable.append(style)
+            if len(style) == 3:
+                fill, width, extra = style
+                markup = f' fill="{fill}"'
+                if width != 1:
+                    markup += f' stroke-width="{width}"'
+            else:
+                anchor, extra = style
+                markup = f' text-anchor="{anchor}"'
+            if extra:
+                markup += f" {extra}"
+            self.styleMarkup.append(markup)
+        return idx
+
+    def add(self, kind, x0, y0, x1, y1, r, color, style, ref=0):
+        self.kinds.append(kind)
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.r.append(r)
+        self.colors.append(self.colorId(color))
+        self.styles.append(self.styleId(style))
+        self.refs.append(ref)
+        self.phaseIds.append(self.currentPhase)
+
+    def addPath(self, segments, closed):
+        idx = len(self.paths)
+        self.paths.append((min(i for i, _ in segments), segments, closed))
+        for i, _ in segments:
+            self.pathRows[i] = idx
+
+    def addUse(self, rows, symbol, x, y, angle=0):
+        idx = len(self.uses)
+        self.uses.append((min(rows), rows, symbol, x, y, angle))
+        for i in rows:
+            self.symbolRows[i] = idx
+
+    # Number of elements in the SVG output
+    def elementCount(self):
+        return (len(self) - sum(len(segments) - 1 for _, segments, _ in self.paths)
+                - sum(len(rows) - 1 for _, rows, _, _, _, _ in self.uses) + sum(len(body) for body in self.symbols))
+
+    # Adds n rows of one kind, color and style from columns of values
+    def addMany(self, kind, x0, y0, x1, y1, r, color, style, refs=None):
+        n = len(x0)
+        self.kinds.extend(array('B', [kind]) * n)
+        self.x0.extend(x0)
+        self.y0.extend(y0)
+        self.x1.extend(x1)
+        self.y1.extend(y1)
+        self.r.extend(r)
+        self.colors.extend(array('H', [self.colorId(color)]) * n)
+        self.styles.extend(array('H', [self.styleId(style)]) * n)
+        self.refs.extend(refs if refs is not None else array('I', [0]) * n)
+        self.phaseIds.extend(array('H', [self.currentPhase]) * n)
+
+    # Drops rows, keeping the others in order. Merged paths and symbols refer to rows, so this has to come first.
+    def removeRows(self, rows):
+        if not rows:
+            return
+        assert not self.paths and not self.uses, "rows removed after merging paths or adding symbols"
+        drop = set(rows)
+        keep = [i for i in range(len(self)) if i not in drop]
+        for column in self.columns():
+            column[:] = array(column.typecode, [column[i] for i in keep])
+
+    # Memory held by the primitive store, in bytes
+    def memoryUsage(self):
+        total = sum(c.itemsize * len(c) for c in self.columns())
+        total += sys.getsizeof(self.texts) + sum(sys.getsizeof(t) for t in self.texts)
+        n = len(self)
+        return {'primitives': n, 'bytes': total, 'bytesPerPrimitive': total / n if n else 0}
 
     def inc_bounds(self, x, y):
         self.bounds[0] = min(self.bounds[0], x)
@@ -82,19 +296,22 @@ class Drawer:
         self.bounds[2] = max(self.bounds[2], x)
         self.bounds[3] = max(self.bounds[3], y)
 
-    def stroke(self, color=None, width=None):
-        color = color or self.color
-        width = width or self.width
-        fill = self.fill
-        s = f'stroke="{color}" fill="{fill}"'
-        if width != 1:
-            s += f' stroke-width="{width}"'
-        return s
+    def shapeStyle(self, extra=""):
+        return (self.fill, self.width, extra)
 
     def line(self, x0, y0, x1, y1, color=None, extra=""):
         self.inc_bounds(x0, y0)
         self.inc_bounds(x1, y1)
-        self.content += f'<line x1="{x0}" y1="{y0}" x2="{x1}" y2="{y1}" {self.stroke(color)} {extra}/>'
+        self.add(self.LINE, x0, y0, x1, y1, 0, color or self.color, self.shapeStyle(extra))
+
+    # Draws many lines at once, from columns of coordinates
+    def lines(self, x0, y0, x1, y1, color=None, extra=""):
+        if not x0:
+            return
+        self.inc_bounds(min(min(x0), min(x1)), min(min(y0), min(y1)))
+        self.inc_bounds(max(max(x0), max(x1)), max(max(y0), max(y1)))
+        self.addMany(self.LINE, x0, y0, x1, y1, array('d', bytes(8 * len(x0))), color or self.color,
+                     self.shapeStyle(extra))
 
     def cross(self, x, y, size, color=None):
         self.line(x - size, y, x + size, y, color)
@@ -103,31 +320,235 @@ class Drawer:
     def circle(self, x, y, radius, color=None):
         self.inc_bounds(x - radius, y - radius)
         self.inc_bounds(x + radius, y + radius)
-        self.content += f'<circle cx="{x}" cy="{y}" r="{radius}" {self.stroke(color)}/>'
+        self.add(self.CIRCLE, x, y, 0, 0, radius, color or self.color, self.shapeStyle())
 
-    def text(self, x, y, text, color=None, fs=5, anchor="middle", extra=""):
-        color = color or self.color
-        self.content += f'<text style="font-family:monospace" fill="{color}" x="{x}" y="{y}" font-size="{fs}" text-anchor="{anchor}" {extra}>{text}</text>'
+    # Draw a text, optionally rotated by rotate degrees around x, y
+    def text(self, x, y, text, color=None, fs=5, anchor="middle", extra="", rotate=None):
+        self.add(self.TEXT, x, y, rotate or 0, 0 if rotate is None else 1, fs, color or self.color, (anchor, extra),
+                 len(self.texts))
+        self.texts.append(str(text))
+
+    # Draws many texts at once, from columns of positions and labels
+    def labels(self, x, y, texts, color=None, fs=5, anchor="middle", extra=""):
+        n = len(x)
+        zeros = array('d', bytes(8 * n))
+        self.addMany(self.TEXT, x, y, zeros, zeros, array('d', [fs]) * n, color or self.color, (anchor, extra),
+                     array('I', range(len(self.texts), len(self.texts) + n)))
+        self.texts.extend(str(t) for t in texts)
 
     # Draw an arc
     def arc(self, cx, cy, radius, angle, rot, color=None, reverse=False, degrees=False):
-        stroke = self.stroke(color)
         largeArc = 0 if reverse else 1
-        ymul = -1 if reverse else 1
         if degrees:
             angle = math.radians(angle)
             rot = math.radians(rot)
-        x0 = cx + math.cos(angle + rot) * radius
-        y0 = cy + math.sin(angle + rot) * radius * ymul
-        x1 = cx + math.cos(-angle + rot) * radius
-        y1 = cy + math.sin(-angle + rot) * radius * ymul
-        self.content += f"""
-            <path d=" M {x0} {y0} A {radius} {radius} 0 {largeArc} 1 {x1} {y1}" {stroke}/>
-        """
+        if reverse:
+            self.add(self.ARC, cx, cy, -(angle + rot), -(-angle + rot), radius, color or self.color, self.shapeStyle(), largeArc)
+        else:
+            self.add(self.ARC, cx, cy, angle + rot, -angle + rot, radius, color or self.color, self.shapeStyle(), largeArc)
         self.inc_bounds(cx - radius, cy - radius)
         self.inc_bounds(cx + radius, cy + radius)
 
-    def toSVG(self):
+    # Draws concentric arcs, one per radius, see arc()
+    def arcs(self, cx, cy, radii, angle, rot, color=None, reverse=False, degrees=False):
+        n = len(radii)
+        if not n:
+            return
+        largeArc = 0 if reverse else 1
+        if degrees:
+            angle = math.radians(angle)
+            rot = math.radians(rot)
+        if reverse:
+            a0, a1 = -(angle + rot), -(-angle + rot)
+        else:
+            a0, a1 = angle + rot, -angle + rot
+        self.addMany(self.ARC, array('d', [cx]) * n, array('d', [cy]) * n, array('d', [a0]) * n,
+                     array('d', [a1]) * n, radii, color or self.color, self.shapeStyle(), array('I', [largeArc]) * n)
+        self.inc_bounds(cx - max(radii), cy - max(radii))
+        self.inc_bounds(cx + max(radii), cy + max(radii))
+
+    # End points of the arc in row i
+    def arcEnds(self, i):
+        cx = self.x0[i]
+        cy = self.y0[i]
+        r = self.r[i]
+        a0 = self.x1[i]
+        a1 = self.y1[i]
+        return cx + math.cos(a0) * r, cy + math.sin(a0) * r, cx + math.cos(a1) * r, cy + math.sin(a1) * r
+
+    # Rows grouped by the layer of their phase
+    def layerRows(self):
+        layers = {}
+        for i, phase in enumerate(self.phaseIds):
+            layers.setdefault(self.phaseTable[phase][1], []).append(i)
+        return layers
+
+    # Bounding box (minx, miny, maxx, maxy) of the geometry in rows, optionally only of the given color.
+    # Text is not included. Returns None if nothing matches.
+    def extent(self, rows=None, color=None):
+        colorIdx = self.colorIndex.get(color) if color else None
+        if color and colorIdx is None:
+            return None
+        minx = miny = math.inf
+        maxx = maxy = -math.inf
+        for i in range(len(self)) if rows is None else rows:
+            kind = self.kinds[i]
+            if kind == self.TEXT or (color and self.colors[i] != colorIdx):
+                continue
+            if kind == self.LINE:
+                minx = min(minx, self.x0[i], self.x1[i])
+                maxx = max(maxx, self.x0[i], self.x1[i])
+                miny = min(miny, self.y0[i], self.y1[i])
+                maxy = max(maxy, self.y0[i], self.y1[i])
+            elif kind == self.ARC:
+                # End points, and the points of the circle on each axis the arc sweeps over
+                cx = self.x0[i]
+                cy = self.y0[i]
+                r = self.r[i]
+                a0 = self.x1[i]
+                sweep = arcSweep(self, i)
+                x0, y0, x1, y1 = self.arcEnds(i)
+                xs = [x0, x1]
+                ys = [y0, y1]
+                for k in range(math.ceil(a0 / (math.pi / 2)), math.floor((a0 + sweep) / (math.pi / 2)) + 1):
+                    xs.append(cx + (r, 0, -r, 0)[k % 4])
+                    ys.append(cy + (0, r, 0, -r)[k % 4])
+                minx = min(minx, *xs)
+                maxx = max(maxx, *xs)
+                miny = min(miny, *ys)
+                maxy = max(maxy, *ys)
+            else:
+                r = self.r[i]
+                minx = min(minx, self.x0[i] - r)
+                maxx = max(maxx, self.x0[i] + r)
+                miny = min(miny, self.y0[i] - r)
+                maxy = max(maxy, self.y0[i] + r)
+        if minx == math.inf:
+            return None
+        return minx, miny, maxx, maxy
+
+    # Copies rows of another Drawer, optionally rotated by 90 degrees around the origin, then moved by dx, dy
+    def place(self, other, rows, dx=0, dy=0, rotate=False):
+
+        def move(x, y):
+            if rotate:
+                x, y = -y, x
+            return x + dx, y + dy
+
+        for i in rows:
+            kind = other.kinds[i]
+            x0, y0 = move(other.x0[i], other.y0[i])
+            x1 = other.x1[i]
+            y1 = other.y1[i]
+            r = other.r[i]
+            ref = other.refs[i]
+            if kind == self.LINE:
+                x1, y1 = move(x1, y1)
+                self.inc_bounds(x0, y0)
+                self.inc_bounds(x1, y1)
+            elif kind == self.TEXT:
+                if rotate:
+                    x1 += 90
+                    y1 = 1
+                ref = len(self.texts)
+                self.texts.append(other.texts[other.refs[i]])
+            elif kind == self.ARC:
+                if rotate:
+                    x1 += math.pi / 2
+                    y1 += math.pi / 2
+            else:
+                self.inc_bounds(x0 - r, y0 - r)
+                self.inc_bounds(x0 + r, y0 + r)
+            previous = self.currentPhase
+            self.currentPhase = self.phaseId(*other.phaseTable[other.phaseIds[i]])
+            self.add(kind, x0, y0, x1, y1, r, other.colorTable[other.colors[i]], other.styleTable[other.styles[i]], ref)
+            self.currentPhase = previous
+            if kind == self.ARC:
+                # Only the swept part, the rest of the circle may lie outside the page
+                minx, miny, maxx, maxy = self.extent([len(self) - 1])
+                self.inc_bounds(minx, miny)
+                self.inc_bounds(maxx, maxy)
+
+    def num(self, v):
+        return num(v, self.precision)
+
+    # Renders path p as a single SVG path element
+    def pathMarkup(self, p):
+        num = self.num
+        first, segments, closed = self.paths[p]
+        parts = []
+        for i, rev in segments:
+            if self.kinds[i] == self.LINE:
+                x0, y0, x1, y1 = self.x0[i], self.y0[i], self.x1[i], self.y1[i]
+            else:
+                x0, y0, x1, y1 = self.arcEnds(i)
+            if rev:
+                x0, y0, x1, y1 = x1, y1, x0, y0
+            if not parts:
+                parts.append(f"M {num(x0)} {num(y0)}")
+            if self.kinds[i] == self.LINE:
+                parts.append(f"L {num(x1)} {num(y1)}")
+            else:
+                r = num(self.r[i])
+                parts.append(f"A {r} {r} 0 {self.refs[i]} {0 if rev else 1} {num(x1)} {num(y1)}")
+        if closed:
+            parts.append("Z")
+        color = self.colorTable[self.colors[first]]
+        style = self.styleMarkup[self.styles[first]]
+        return f'  <path d="{" ".join(parts)}" stroke="{color}"{style} />\n'
+
+    # Renders symbol k as a group in <defs>
+    def symbolMarkup(self, k):
+        body = self.symbols[k]
+        body.precision = self.precision
+        return f'  <g id="s{k}">\n' + "".join([body.markup(i) for i in range(len(body))]) + "  </g>\n"
+
+    # Renders use u as a reference to its symbol, moved and rotated in place
+    def useMarkup(self, u):
+        _, _, symbol, x, y, angle = self.uses[u]
+        x = self.num(x)
+        y = self.num(y)
+        if angle:
+            angle = num(angle, None if self.precision is None else self.precision + 2)
+            return f'  <use xlink:href="#s{symbol}" transform="translate({x} {y}) rotate({angle})" />\n'
+        return f'  <use xlink:href="#s{symbol}" x="{x}" y="{y}" />\n'
+
+    # Renders row i as SVG markup
+    def markup(self, i):
+        if self.symbolRows:
+            u = self.symbolRows.get(i)
+            if u is not None:
+                return self.useMarkup(u) if self.uses[u][0] == i else ""
+        if self.pathRows:
+            p = self.pathRows.get(i)
+            if p is not None:
+                return self.pathMarkup(p) if self.paths[p][0] == i else ""
+        num = self.num
+        kind = self.kinds[i]
+        color = self.colorTable[self.colors[i]]
+        style = self.styleMarkup[self.styles[i]]
+        if kind == self.LINE:
+            return (f'  <line x1="{num(self.x0[i])}" y1="{num(self.y0[i])}" x2="{num(self.x1[i])}" y2="{num(self.y1[i])}"'
+                    f' stroke="{color}"{style} />\n')
+        if kind == self.CIRCLE:
+            return f'  <circle cx="{num(self.x0[i])}" cy="{num(self.y0[i])}" r="{num(self.r[i])}" stroke="{color}"{style} />\n'
+        if kind == self.ARC:
+            x0, y0, x1, y1 = self.arcEnds(i)
+            r = num(self.r[i])
+            return (f'  <path d=" M {num(x0)} {num(y0)} A {r} {r} 0 {self.refs[i]} 1 {num(x1)} {num(y1)}"'
+                    f' stroke="{color}"{style} />\n')
+        text = escape(self.texts[self.refs[i]])
+        if self.y1[i]:
+            position = f'x="0" y="0" font-size="{num(self.r[i])}"'
+            anchor, extra = self.styleTable[self.styles[i]]
+            style = f' text-anchor="{anchor}" transform="translate({num(self.x0[i])}, {num(self.y0[i])}) rotate({num(self.x1[i])})"'
+            if extra:
+                style += f" {extra}"
+        else:
+            position = f'x="{num(self.x0[i])}" y="{num(self.y0[i])}" font-size="{num(self.r[i])}"'
+        return f'  <text style="font-family:monospace" fill="{color}" {position}{style}>{text}</text>\n'
+
+    def header(self):
         minx = self.bounds[0]
         miny = self.bounds[1]
         maxx = math.ceil(self.bounds[2] + self.margin)
@@ -135,17 +556,180 @@ class Drawer:
         assert minx == 0 and miny == 0, f'minx={minx} miny={miny}'
         width = maxx
         height = maxy
-        s = f'<svg  version="1.1" xmlns="http://www.w3.org/2000/svg" width="{width}mm" height="{height}mm" viewBox="0 0 {maxx} {maxy}">'
-        s += self.content
-        s += f'</svg>'
+        if not self.symbols:
+            return ("<?xml version='1.0' encoding='utf8'?>\n"
+                    f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{width}mm" height="{height}mm" viewBox="0 0 {maxx} {maxy}">\n')
+        # <g> rather than <symbol>, which would clip everything outside the viewport of the <use>
+        defs = "".join([self.symbolMarkup(k) for k in range(len(self.symbols))])
+        return ("<?xml version='1.0' encoding='utf8'?>\n"
+                f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1"'
+                f' width="{width}mm" height="{height}mm" viewBox="0 0 {maxx} {maxy}">\n'
+                f'<defs>\n{defs}</defs>\n')
 
-        try:
-            elem = ET.fromstring(s)
-            ET.indent(elem, space="  ", level=0)
-            s = ET.tostring(elem, encoding='utf8', method='xml').decode()
-            s = s.replace('ns0:', '').replace(':ns0', '')
-            return s
-        except ET.ParseError as e:
-            err(str(e) + f"\n...{s[e.position[1] - 30 : e.position[1] + 30]}...")
+    # Streams the indented document to a file object without building it in memory
+    def writeSVG(self, out, validate=False):
+        if validate:
+            out.write(self.toSVG(validate=True))
+            return
+        if self.profiler:
+            self.profiler.serialize(self, out)
+            return
+        out.write(self.header())
+        n = len(self)
+        for start in range(0, n, self.CHUNK):
+            out.write("".join([self.markup(i) for i in range(start, min(start + self.CHUNK, n))]))
+        out.write('</svg>')
+
+    def toSVG(self, validate=False):
+        out = io.StringIO()
+        self.writeSVG(out)
+        s = out.getvalue()
+        if validate:
+            validateSVG(s)
+        return s
+
+
+# Checks that a generated document is well-formed XML
+def validateSVG(s):
+    import xml.etree.ElementTree as ET
+    try:
+        ET.fromstring(s)
+    except ET.ParseError as e:
+        # position is a line and a column within it, the output spans many lines
+        line, column = e.position
+        lines = s.splitlines()
+        text = lines[line - 1] if 0 < line <= len(lines) else ""
+        err(str(e) + f"\n...{text[max(0, column - 30) : column + 30]}...")
+
+
+# Collects wall time, primitive counts and emitted bytes per generating phase of a Drawer.
+# Attach it with drawer.profiler before drawing, see Drawer.phase().
+class Profiler:
+
+    SERIALIZE = "toSVG"
+
+    def __init__(self):
+        self.seconds = {}
+        self.bytes = {}
+        self.serializeSeconds = 0
+        self.serializeBytes = 0
+
+    def time(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0) + seconds
+
+    # Writes the SVG like Drawer.writeSVG, counting bytes per phase
+    def serialize(self, d, out):
+        start = time.perf_counter()
+        header = d.header()
+        out.write(header)
+        n = len(d)
+        for chunk in range(0, n, d.CHUNK):
+            parts = [d.markup(i) for i in range(chunk, min(chunk + d.CHUNK, n))]
+            self.count(d, chunk, parts)
+            out.write("".join(parts))
+        out.write('</svg>')
+        self.serializeBytes += len(header) + len('</svg>')
+        self.serializeSeconds += time.perf_counter() - start
+
+    # Adds the output of consecutive rows from start, one string per row, to the bytes of their phases
+    def count(self, d, start, parts):
+        phaseIds = d.phaseIds
+        for i, part in enumerate(parts, start):
+            self.bytes[phaseIds[i]] = self.bytes.get(phaseIds[i], 0) + len(part)
+
+    def report(self, d):
+        counts = {}
+        for kind, color, phase in zip(d.kinds, d.colors, d.phaseIds):
+            c = counts.setdefault(phase, ({}, {}))
+            kindName = d.KIND_NAMES[kind]
+            colorName = d.colorTable[color]
+            c[0][kindName] = c[0].get(kindName, 0) + 1
+            c[1][colorName] = c[1].get(colorName, 0) + 1
+        phases = []
+        for idx, (name, layer) in enumerate(d.phaseTable):
+            kinds, colors = counts.get(idx, ({}, {}))
+            if not kinds and idx not in self.seconds:
+                continue
+            phases.append({
+                'phase': name or "-",
+                'layer': layer,
+                'seconds': self.seconds.get(idx, 0),
+                'primitives': sum(kinds.values()),
+                'bytes': self.bytes.get(idx, 0),
+                'kinds': kinds,
+                'colors': colors,
+            })
+        phases.append({'phase': self.SERIALIZE, 'layer': 0, 'seconds': self.serializeSeconds, 'primitives': 0,
+                       'bytes': self.serializeBytes, 'kinds': {}, 'colors': {}})
+        return phases
+
+    def format(self, d, fmt="text"):
+        phases = self.report(d)
+        if fmt == "json":
+            return json.dumps(phases, indent=2)
+        lines = [f"{'phase':<16} {'layer':>5} {'time':>10} {'prims':>8} {'bytes':>10}  kinds / colors"]
+        for p in phases:
+            detail = ", ".join(f"{k}={v}" for k, v in list(p['kinds'].items()) + list(p['colors'].items()))
+            lines.append(f"{p['phase']:<16} {p['layer']:>5} {p['seconds'] * 1000:>8.2f}ms {p['primitives']:>8} "
+                         f"{p['bytes']:>10}  {detail}")
+        total = sum(p['seconds'] for p in phases)
+        lines.append(f"{'total':<16} {'':>5} {total * 1000:>8.2f}ms {len(d):>8} {sum(p['bytes'] for p in phases):>10}")
+        return "\n".join(lines)
+
+
+# Disjoint sets of keys, like rows grouped by what touches what
+class UnionFind:
+
+    def __init__(self, keys):
+        self.parent = {k: k for k in keys}
+
+    # Representative of the set holding key
+    def find(self, key):
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+# Uniform grid over axis-aligned boxes, to find candidates for overlap and clearance checks
+class GridIndex:
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.cells = {}
+        self.boxes = {}
+
+    def cellRange(self, minx, miny, maxx, maxy):
+        c = self.cell
+        for cx in range(math.floor(minx / c), math.floor(maxx / c) + 1):
+            for cy in range(math.floor(miny / c), math.floor(maxy / c) + 1):
+                yield cx, cy
+
+    def insert(self, key, minx, miny, maxx, maxy):
+        self.boxes[key] = (minx, miny, maxx, maxy)
+        for cell in self.cellRange(minx, miny, maxx, maxy):
+            self.cells.setdefault(cell, []).append(key)
 
+    def remove(self, key):
+        for cell in self.cellRange(*self.boxes.pop(key)):
+            self.cells[cell].remove(key)
 
+    # Keys of the boxes intersecting the given box, expanded by margin
+    def query(self, minx, miny, maxx, maxy, margin=0):
+        minx -= margin
+        miny -= margin
+        maxx += margin
+        maxy += margin
+        found = set()
+        for cell in self.cellRange(minx, miny, maxx, maxy):
+            for key in self.cells.get(cell, ()):
+                if key in found:
+                    continue
+                bx0, by0, bx1, by1 = self.boxes[key]
+                if bx0 <= maxx and bx1 >= minx and by0 <= maxy and by1 >= miny:
+                    found.add(key)
+        return found
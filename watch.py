@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import utils
+from jig import PHASE_INPUTS, jigParams, jigPhases
+from utils import Drawer
+
+
+# Rendered markup of jig phases, keyed by phase name and layer. A phase is only redrawn when its
+# position or the parameters it depends on (see jig.PHASE_INPUTS) change.
+class FragmentCache:
+
+    def __init__(self, precision=None):
+        self.precision = precision
+        # (name, layer) -> (inputs, markup, bounds)
+        self.fragments = {}
+        self.drawn = 0
+        self.reused = 0
+
+    # Draws a single phase on its own Drawer, returns its markup and bounds
+    def draw(self, name, layer, draw):
+        d = Drawer(precision=self.precision)
+        with d.phase(name, layer):
+            draw(d)
+        return "".join([d.markup(i) for i in range(len(d))]), d.bounds
+
+    # Returns the SVG for converted jig parameters, the same as drawJig(p).toSVG()
+    def render(self, p):
+        self.drawn = 0
+        self.reused = 0
+        fragments = []
+        bounds = [0, 0, 0, 0]
+        used = set()
+        for name, layer, cx, cy, draw in jigPhases(p):
+            inputs = json.dumps([cx, cy] + [p[k] for k in PHASE_INPUTS[name]])
+            cached = self.fragments.get((name, layer))
+            if cached is None or cached[0] != inputs:
+                cached = self.fragments[(name, layer)] = (inputs,) + self.draw(name, layer, draw)
+                self.drawn += 1
+            else:
+                self.reused += 1
+            used.add((name, layer))
+            fragments.append(cached[1])
+            b = cached[2]
+            bounds = [min(bounds[0], b[0]), min(bounds[1], b[1]), max(bounds[2], b[2]), max(bounds[3], b[3])]
+        # Drop phases that are gone, e.g. after switching to a single layer
+        for key in set(self.fragments) - used:
+            del self.fragments[key]
+        d = Drawer(precision=self.precision)
+        d.bounds = bounds
+        return d.header() + "".join(fragments) + "</svg>"
+
+
+# Writes the file in one step, so that viewers never see it half written
+def writeAtomic(path, data):
+    tmp = path + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# Re-renders output whenever the parameter file changes. The file holds one JSON object with jig options.
+def watch(paramsPath, output, precision=None, interval=0.2):
+    cache = FragmentCache(precision)
+    seen = None
+    while True:
+        try:
+            st = os.stat(paramsPath)
+            version = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            version = None
+        if version is not None and version != seen:
+            seen = version
+            start = time.perf_counter()
+            try:
+                with open(paramsPath) as f:
+                    params = json.load(f)
+                writeAtomic(output, cache.render(jigParams(params)) + "\n")
+            except Exception as e:
+                # Keep watching, the next edit may fix it
+                print(f"FAIL {paramsPath}: {type(e).__name__}: {e}", file=sys.stderr)
+            else:
+                print(f"{output}: {cache.drawn} phases drawn, {cache.reused} reused, "
+                      f"{(time.perf_counter() - start) * 1000:.1f}ms", file=sys.stderr)
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-render a jig whenever its parameter file changes.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('params', help="JSON file with the jig options, e.g. {\"shape\": \"narrow\"}")
+    parser.add_argument('--output', help="SVG file to keep up to date, the parameter file name with .svg if not given")
+    parser.add_argument('--precision', type=int, help="Decimals of coordinates in the output, full precision if not given")
+    parser.add_argument('--interval', type=float, default=0.2, help="Seconds between checks of the parameter file")
+
+    args = parser.parse_args()
+    utils.debug = False
+    output = args.output or os.path.splitext(args.params)[0] + ".svg"
+    try:
+        watch(args.params, output, args.precision, args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()